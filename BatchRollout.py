@@ -0,0 +1,134 @@
+import argparse
+import functools
+import random
+import time
+import numpy as np
+import Bitboard
+import Rules
+from Rules import PLAYER, AI
+
+ONE = np.uint64(1)
+
+rng = np.random.default_rng()
+
+# (direction shifts, column limits) of a board size as numpy values, raises
+# ValueError for boards that do not fit in 64 bits
+@functools.lru_cache(maxsize=None)
+def tables(geometry):
+    if not geometry.fits_uint64:
+        raise ValueError(f"{geometry.name} boards do not fit in 64 bits")
+    shifts = [(np.uint64(s), np.uint64(2 * s)) for s in geometry.directions]
+    return shifts, np.array(geometry.column_limits, dtype=np.int64)
+
+# (shifts 1, 2 and 3 times each direction, bottom mask, board mask) as
+# numpy values for winning_cells_batch
+@functools.lru_cache(maxsize=None)
+def cell_tables(geometry):
+    tables(geometry)
+    shifts = [tuple(np.uint64(k * s) for k in (1, 2, 3)) for s in geometry.directions]
+    return shifts, np.uint64(geometry.bottom_mask), np.uint64(geometry.board_mask)
+
+# has_four over a uint64 array of bitboards, returns a bool array
+def has_four_batch(b, geometry=Rules.STANDARD):
+    shifts, _ = tables(geometry)
+    won = np.zeros(b.shape, dtype=bool)
+    for shift, double_shift in shifts:
+        m = b & (b >> shift)
+        won |= (m & (m >> double_shift)) != 0
+    return won
+
+# Geometry.winning_cells over uint64 arrays of bitboards b and occupied
+# cells mask
+def winning_cells_batch(b, mask, geometry=Rules.STANDARD):
+    shifts, _, board_mask = cell_tables(geometry)
+    vertical, *others = shifts
+    one, two, three = vertical
+    cells = (b << one) & (b << two) & (b << three)
+    for one, two, three in others:
+        pair = (b << one) & (b << two)
+        cells |= pair & ((b << three) | (b >> one))
+        pair = (b >> one) & (b >> two)
+        cells |= pair & ((b << one) | (b >> three))
+    return cells & (board_mask ^ mask)
+
+# cells a piece can be dropped into, one per playable column, of every
+# occupied cells mask of a uint64 array
+def playable_cells_batch(mask, geometry=Rules.STANDARD):
+    _, bottom_mask, board_mask = cell_tables(geometry)
+    return (mask + bottom_mask) & board_mask
+
+# plays n random games at once from state, opp being the player who made the
+# last move, with the same policy as MCTS.rollout (play a winning move if
+# there is one, otherwise a uniformly random legal move); returns the winner
+# of every game (EMPTY for a draw) as an int8 array
+def batch_rollout(state, opp, n):
+    winners = np.zeros(n, dtype=np.int8)
+    if state.winning_move(opp):
+        winners[:] = opp
+        return winners
+    player = AI if opp == PLAYER else PLAYER
+    geometry = state.geometry
+    _, column_limits = tables(geometry)
+    # boards[0] is the player to move, boards[1] the other one, for the live games only
+    boards = np.empty((2, n), dtype=np.uint64)
+    boards[0] = state.boards[player]
+    boards[1] = state.boards[opp]
+    heights = np.tile(np.array(state.heights, dtype=np.int64), (n, 1))
+    live = np.arange(n)
+    while len(live):
+        legal = heights < column_limits
+        # games without a legal move are draws
+        playable = legal.any(axis=1)
+        if not playable.all():
+            boards, heights, legal, live = boards[:, playable], heights[playable], legal[playable], live[playable]
+            if not len(live):
+                break
+        moves = ONE << heights.astype(np.uint64)
+        # play a winning move where one exists
+        mask = boards[0] | boards[1]
+        won = (winning_cells_batch(boards[0], mask, geometry) & playable_cells_batch(mask, geometry)) != 0
+        if won.any():
+            winners[live[won]] = player
+            keep = ~won
+            boards, heights, legal, moves, live = boards[:, keep], heights[keep], legal[keep], moves[keep], live[keep]
+            if not len(live):
+                break
+        # otherwise a random legal column: argmax of random keys on legal columns
+        actions = np.argmax(rng.random(legal.shape) * legal, axis=1)
+        rows = np.arange(len(live))
+        boards[0] |= moves[rows, actions]
+        heights[rows, actions] += 1
+        # swap sides
+        boards = boards[::-1]
+        player, opp = opp, player
+    return winners
+
+# rollouts per second of the scalar MCTS.rollout and of batch_rollout from the empty board
+def throughput_report(batch_sizes, time_limit=2):
+    import MCTS
+    results = []
+    state = Bitboard.Bitboard()
+    rollouts = 0
+    t0 = time.time()
+    while time.time() - t0 < time_limit:
+        MCTS.rollout(state.copy(), AI)
+        rollouts += 1
+    results.append(("scalar", rollouts / (time.time() - t0)))
+    for n in batch_sizes:
+        rollouts = 0
+        t0 = time.time()
+        while time.time() - t0 < time_limit:
+            batch_rollout(state, AI, n)
+            rollouts += n
+        results.append((f"batch {n}", rollouts / (time.time() - t0)))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch rollout throughput")
+    parser.add_argument("--batch", type=int, nargs="+", default=[64, 256, 1024, 4096])
+    parser.add_argument("--time", type=float, default=2)
+    args = parser.parse_args()
+    random.seed(0)
+    print(f"{'mode':>12} {'rollouts/s':>12}")
+    for mode, rate in throughput_report(args.batch, args.time):
+        print(f"{mode:>12} {rate:>12.0f}")
@@ -0,0 +1,142 @@
+import Rules
+from Rules import EMPTY, PLAYER, AI
+
+class Bitboard:
+
+    __slots__ = ("boards", "heights", "moves", "hash", "geometry")
+
+    def __init__(self, geometry=Rules.STANDARD):
+        # Rules.Geometry of the board size, shared by every board of the size
+        self.geometry = geometry
+        # one bitboard per player, index 0 (EMPTY) unused
+        self.boards = [0, 0, 0]
+        # bit index of the next free cell in every column
+        self.heights = [c * geometry.height for c in range(geometry.cols)]
+        self.moves = 0
+        # zobrist hash of the position, updated incrementally by play/undo
+        self.hash = 0
+
+    def copy(self):
+        new_board = Bitboard.__new__(Bitboard)
+        new_board.geometry = self.geometry
+        new_board.boards = self.boards[:]
+        new_board.heights = self.heights[:]
+        new_board.moves = self.moves
+        new_board.hash = self.hash
+        return new_board
+
+    # occupied cells of both players
+    @property
+    def mask(self):
+        return self.boards[PLAYER] | self.boards[AI]
+
+    def can_play(self, col):
+        return self.heights[col] < self.geometry.column_limits[col]
+
+    def play(self, col, player):
+        bit = self.heights[col]
+        self.boards[player] |= 1 << bit
+        self.heights[col] = bit + 1
+        self.moves += 1
+        self.hash ^= self.geometry.zobrist[player][bit]
+
+    # exact inverse of play, col must be the last column played by player
+    def undo(self, col, player):
+        bit = self.heights[col] - 1
+        self.heights[col] = bit
+        self.boards[player] ^= 1 << bit
+        self.moves -= 1
+        self.hash ^= self.geometry.zobrist[player][bit]
+
+    # returns indeces of valid columns
+    def get_available_actions(self):
+        heights = self.heights
+        limits = self.geometry.column_limits
+        return [c for c in range(len(limits)) if heights[c] < limits[c]]
+
+    # bitmask of the cells a piece can be dropped into (one per playable column)
+    def available_mask(self):
+        geometry = self.geometry
+        return (self.mask + geometry.bottom_mask) & geometry.board_mask
+
+    # returns index of first available row in a given column
+    def get_next_open_row(self, col):
+        if self.can_play(col):
+            geometry = self.geometry
+            return geometry.rows - 1 - (self.heights[col] - col * geometry.height)
+
+    # unique key of the position with player to move: in every column the
+    # mover's pieces below a marker bit on top of the column's pieces
+    def key(self, player):
+        return self.boards[player] + self.mask + self.geometry.bottom_mask
+
+    # smallest key of the position and its mirror image, and whether it is
+    # the mirror's (moves then map to cols - 1 - col)
+    def canonical_key(self, player):
+        key = self.key(player)
+        geometry = self.geometry
+        mirrored = geometry.mirror_bits(self.boards[player]) + geometry.mirror_bits(self.mask) + geometry.bottom_mask
+        if mirrored < key:
+            return mirrored, True
+        return key, False
+
+    def winning_move(self, player):
+        return self.geometry.has_four(self.boards[player])
+
+    def empty_spaces(self):
+        return self.geometry.size - self.moves
+
+    def is_full(self):
+        return self.moves == self.geometry.size
+
+    # true once a player has four in a row or the board is full
+    def is_over(self):
+        return self.winning_move(PLAYER) or self.winning_move(AI) or self.is_full()
+
+    # (board, player to move) after moves, the columns played from the empty
+    # board by first and the other player in turn, as ints or as a string of
+    # digits such as "3342"; raises ValueError for an illegal move or a move
+    # played after the game was won
+    @classmethod
+    def from_moves(cls, moves, first=PLAYER, geometry=Rules.STANDARD):
+        board = cls(geometry)
+        player = first
+        for move in moves:
+            if isinstance(move, str) and len(move) == 1 and move in "0123456789":
+                col = int(move)
+            elif isinstance(move, int) and not isinstance(move, bool):
+                col = move
+            else:
+                raise ValueError(f"illegal move {move!r}")
+            if not 0 <= col < geometry.cols or not board.can_play(col):
+                raise ValueError(f"illegal move {move!r}")
+            if board.winning_move(AI if player == PLAYER else PLAYER):
+                raise ValueError("game is already over")
+            board.play(col, player)
+            player = AI if player == PLAYER else PLAYER
+        return board, player
+
+    # conversion layer from/to the (rows, cols) int array used by Gameboard
+    @classmethod
+    def from_state(cls, state):
+        rows, cols = len(state), len(state[0])
+        board = cls(Rules.geometry(rows, cols))
+        for c in range(cols):
+            for r in range(rows - 1, -1, -1):
+                player = int(state[r][c])
+                if player == EMPTY:
+                    break
+                board.play(c, player)
+        return board
+
+    def to_state(self):
+        import numpy as np
+        geometry = self.geometry
+        state = np.zeros((geometry.rows, geometry.cols), dtype=int)
+        for player in (PLAYER, AI):
+            b = self.boards[player]
+            for c in range(geometry.cols):
+                for r in range(geometry.rows):
+                    if b >> geometry.cell_bit(r, c) & 1:
+                        state[r][c] = player
+        return state
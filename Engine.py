@@ -0,0 +1,109 @@
+import threading
+import time
+import SearchStats
+
+class Engine:
+
+    # headless search interface shared by MiniMax and MCTS: positions are
+    # Bitboards, nothing here imports pygame or waits on a display, and the
+    # search state (tree, transposition table) is kept between calls so that
+    # a client only has to report the moves played with play()
+
+    def __init__(self, book=None):
+        # OpeningBook consulted before searching
+        self.book = book
+        self.ponder_thread = None
+        self.ponder_stop = None
+        # SearchStats.Observer instances, stats are only collected while
+        # there is at least one
+        self.observers = []
+
+    # starts over from position, player being the player to move
+    def set_position(self, position, player):
+        raise NotImplementedError
+
+    # true if position is the engine's current position, which best_move
+    # then keeps searching instead of starting over with set_position; empty
+    # boards of different sizes have the same pieces, so the geometry counts
+    def in_sync(self, position, player):
+        return position.geometry is self.board.geometry and position.boards == self.board.boards
+
+    # searches position for at most budget seconds (the engine's own time
+    # limit if None) and returns (move, stats) for player
+    def best_move(self, position, player, budget=None):
+        raise NotImplementedError
+
+    # (move, stats) from the opening book for position, or None
+    def book_move(self, position, player):
+        if self.book is None:
+            return None
+        entry = self.book.lookup(position, player)
+        if entry is None:
+            return None
+        move, score = entry
+        return move, {"book": True, "score": score}
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        self.observers.remove(observer)
+
+    # SearchStats for a search starting now, None if nobody observes
+    def begin_stats(self, player):
+        if not self.observers:
+            return None
+        stats = SearchStats.SearchStats(type(self).__name__, player)
+        intervals = [o.sample_interval for o in self.observers if o.sample_interval > 0]
+        if intervals:
+            stats.next_sample = stats.start + min(intervals)
+        return stats
+
+    # hands stats to the sampling observers once the next sample is due,
+    # called by the engines between playouts or every few thousand nodes
+    def sample(self, stats):
+        if stats.next_sample is None:
+            return
+        now = time.perf_counter()
+        if now < stats.next_sample:
+            return
+        stats.time = now - stats.start
+        interval = min(o.sample_interval for o in self.observers if o.sample_interval > 0)
+        stats.next_sample = now + interval
+        for observer in self.observers:
+            if observer.sample_interval > 0:
+                observer.on_sample(stats)
+
+    def end_stats(self, stats, move):
+        stats.move = move
+        stats.time = time.perf_counter() - stats.start
+        for observer in self.observers:
+            observer.on_move(stats)
+
+    # plays move for player on the engine's current position
+    def play(self, move, player):
+        raise NotImplementedError
+
+    # keeps searching the current position in a background thread while
+    # player (the opponent) thinks; stop_pondering() must be called before
+    # any other method of the engine
+    def start_pondering(self, player):
+        self.stop_pondering()
+        self.ponder_stop = threading.Event()
+        self.ponder_thread = threading.Thread(target=self.ponder, args=(player, self.ponder_stop), daemon=True)
+        self.ponder_thread.start()
+
+    def stop_pondering(self):
+        if self.ponder_thread is not None:
+            self.ponder_stop.set()
+            self.ponder_thread.join()
+            self.ponder_thread = None
+            self.ponder_stop = None
+
+    # searches the current position, player to move, until stop is set
+    def ponder(self, player, stop):
+        pass
+
+    # releases worker processes and other resources
+    def close(self):
+        self.stop_pondering()
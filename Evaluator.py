@@ -0,0 +1,144 @@
+import functools
+import math
+import Rules
+from Rules import PLAYER, AI
+
+CENTER_SCORE = 3
+
+# WINDOW_SCORE[mine][theirs]: score of a window for the player holding `mine`
+# of its cells while the opponent holds `theirs`, same values as
+# utils.evaluate_window; completed fours are counted apart
+WINDOW_SCORE = [[0] * 5 for _ in range(5)]
+WINDOW_SCORE[3][0] = 5
+WINDOW_SCORE[2][0] = 2
+
+# turns the positional scores and four counts of both sides into one score
+# from player's side: a four outweighs everything, fours on both sides
+# (never reached in a game) cancel out instead of giving inf - inf
+def combine(score, opp_score, fours, opp_fours):
+    if bool(fours) != bool(opp_fours):
+        return math.inf if fours else -math.inf
+    return score - opp_score
+
+# (windows through every bit, whether every bit is in the center column) of
+# a board size, built once per size
+@functools.lru_cache(maxsize=None)
+def tables(geometry):
+    window_bits = [[bit for bit in range(geometry.bits) if window >> bit & 1] for window in geometry.windows]
+    bit_windows = [[w for w, bits in enumerate(window_bits) if bit in bits] for bit in range(geometry.bits)]
+    center_bits = [bool(geometry.center_mask >> bit & 1) for bit in range(geometry.bits)]
+    return bit_windows, center_bits
+
+class Evaluator:
+
+    # heuristic evaluation of a position kept up to date by play/undo, which
+    # only touch the windows through the dropped cell
+    __slots__ = ("counts", "scores", "fours", "bit_windows", "center_bits")
+
+    def __init__(self, geometry=Rules.STANDARD):
+        self.bit_windows, self.center_bits = tables(geometry)
+        # pieces of each player per window, index 0 (EMPTY) unused
+        windows = len(geometry.windows)
+        self.counts = [None, [0] * windows, [0] * windows]
+        self.scores = [0, 0, 0]
+        self.fours = [0, 0, 0]
+
+    @classmethod
+    def from_board(cls, board):
+        evaluator = cls(board.geometry)
+        for player in (PLAYER, AI):
+            b = board.boards[player]
+            for bit in range(board.geometry.bits):
+                if b >> bit & 1:
+                    evaluator.play(bit, player)
+        return evaluator
+
+    # bit is the cell the piece lands in, board.heights[col] before the move
+    def play(self, bit, player):
+        opp = AI if player == PLAYER else PLAYER
+        mine = self.counts[player]
+        theirs = self.counts[opp]
+        score = CENTER_SCORE if self.center_bits[bit] else 0
+        opp_score = 0
+        for w in self.bit_windows[bit]:
+            m = mine[w]
+            t = theirs[w]
+            score += WINDOW_SCORE[m + 1][t] - WINDOW_SCORE[m][t]
+            opp_score += WINDOW_SCORE[t][m + 1] - WINDOW_SCORE[t][m]
+            if m == 3:
+                self.fours[player] += 1
+            mine[w] = m + 1
+        self.scores[player] += score
+        self.scores[opp] += opp_score
+
+    # exact inverse of play
+    def undo(self, bit, player):
+        opp = AI if player == PLAYER else PLAYER
+        mine = self.counts[player]
+        theirs = self.counts[opp]
+        score = CENTER_SCORE if self.center_bits[bit] else 0
+        opp_score = 0
+        for w in self.bit_windows[bit]:
+            m = mine[w] - 1
+            t = theirs[w]
+            score += WINDOW_SCORE[m + 1][t] - WINDOW_SCORE[m][t]
+            opp_score += WINDOW_SCORE[t][m + 1] - WINDOW_SCORE[t][m]
+            if m == 3:
+                self.fours[player] -= 1
+            mine[w] = m
+        self.scores[player] -= score
+        self.scores[opp] -= opp_score
+
+    def evaluate(self, player):
+        opp = AI if player == PLAYER else PLAYER
+        return combine(self.scores[player], self.scores[opp], self.fours[player], self.fours[opp])
+
+
+# numpy's bit count per uint64 element, or a 16-bit lookup table on numpy
+# versions without one; numpy is only imported by the batch functions
+@functools.lru_cache(maxsize=None)
+def popcount_function():
+    import numpy as np
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count
+    table = np.array([bin(i).count("1") for i in range(1 << 16)], dtype=np.uint8)
+    def popcount(x):
+        count = np.zeros(x.shape, dtype=np.uint8)
+        for shift in range(0, 64, 16):
+            count += table[(x >> np.uint64(shift)) & np.uint64(0xFFFF)]
+        return count
+    return popcount
+
+# (window masks, center mask) of a board size as uint64, raises ValueError
+# for boards that do not fit
+@functools.lru_cache(maxsize=None)
+def batch_tables(geometry):
+    import numpy as np
+    if not geometry.fits_uint64:
+        raise ValueError(f"{geometry.name} boards do not fit in 64 bits")
+    return np.array(geometry.windows, dtype=np.uint64), np.uint64(geometry.center_mask)
+
+# scores many positions at once from the side of `mine`: mine and theirs are
+# uint64 arrays holding the bitboards of both players for every position
+def evaluate_batch(mine, theirs, geometry=Rules.STANDARD):
+    import numpy as np
+    window_masks, center_mask = batch_tables(geometry)
+    popcount = popcount_function()
+    mine = np.asarray(mine, dtype=np.uint64)
+    theirs = np.asarray(theirs, dtype=np.uint64)
+    own_counts = popcount(mine[:, None] & window_masks).astype(np.int8)
+    opp_counts = popcount(theirs[:, None] & window_masks).astype(np.int8)
+    own_free = opp_counts == 0
+    opp_free = own_counts == 0
+    three = WINDOW_SCORE[3][0]
+    two = WINDOW_SCORE[2][0]
+    score = (three * ((own_counts == 3) & own_free) + two * ((own_counts == 2) & own_free)).sum(axis=1)
+    opp_score = (three * ((opp_counts == 3) & opp_free) + two * ((opp_counts == 2) & opp_free)).sum(axis=1)
+    score = score + CENTER_SCORE * popcount(mine & center_mask).astype(np.int64)
+    opp_score = opp_score + CENTER_SCORE * popcount(theirs & center_mask).astype(np.int64)
+    fours = (own_counts == 4).sum(axis=1)
+    opp_fours = (opp_counts == 4).sum(axis=1)
+    result = (score - opp_score).astype(np.float64)
+    result[(fours > 0) & (opp_fours == 0)] = math.inf
+    result[(fours == 0) & (opp_fours > 0)] = -math.inf
+    return result
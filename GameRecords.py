@@ -0,0 +1,249 @@
+import argparse
+import array
+import mmap
+import os
+import struct
+import time
+import numpy as np
+import Bitboard
+import Rules
+from Rules import PLAYER, AI
+
+MAGIC = b"C4GR"
+VERSION = 1
+HEADER = struct.Struct("<4sB") # magic, version
+
+# every game is one byte holding the number of moves (bits 0-5) and the
+# first player (bit 6 set if AI moved first) followed by the moves packed
+# three bits each, little endian: at most 17 bytes for a full board. The
+# stream does not say which board size its games were played on, readers
+# must know it; boards up to 8 columns and 63 cells fit
+MOVE_BITS = 3
+COUNT_MASK = 0x3F
+FIRST_AI = 0x40
+
+INDEX_MAGIC = b"C4GI"
+INDEX_HEADER = struct.Struct("<4sQ") # magic, number of positions
+
+# true if games of geometry fit in records: at most 8 columns and 63 cells
+def supports(geometry):
+    return geometry.cols <= 1 << MOVE_BITS and geometry.size <= COUNT_MASK
+
+def packed_size(count):
+    return (count * MOVE_BITS + 7) // 8
+
+def encode(moves, first=PLAYER):
+    if len(moves) > COUNT_MASK:
+        raise ValueError(f"{len(moves)} moves do not fit in a record")
+    packed = 0
+    for i, move in enumerate(moves):
+        if not 0 <= move < 1 << MOVE_BITS:
+            raise ValueError(f"illegal move {move!r}")
+        packed |= move << (MOVE_BITS * i)
+    header = len(moves) | (FIRST_AI if first == AI else 0)
+    return bytes((header,)) + packed.to_bytes(packed_size(len(moves)), "little")
+
+# raises ValueError unless data starts with the stream header
+def check_header(data, path):
+    if len(data) < HEADER.size or HEADER.unpack_from(data, 0) != (MAGIC, VERSION):
+        raise ValueError(f"{path} is not a game record stream")
+
+class GameWriter:
+
+    # appends games to path, encoded records are kept in memory until
+    # buffer_size bytes are pending so that a game costs no system call. A
+    # record cut short by a crashed writer is dropped before appending,
+    # readers would otherwise decode it and the games after it as garbage
+    def __init__(self, path, buffer_size=1 << 16):
+        self.path = path
+        self.buffer_size = buffer_size
+        end = 0
+        if os.path.exists(path) and os.path.getsize(path):
+            with GameReader(path) as reader:
+                end = reader.end()
+        self.file = open(path, "ab")
+        if end and self.file.tell() > end:
+            self.file.truncate(end)
+            self.file.seek(end)
+        if self.file.tell() == 0:
+            self.file.write(HEADER.pack(MAGIC, VERSION))
+        # file offset of the next game, buffered bytes included
+        self.offset = self.file.tell()
+        self.buffer = bytearray()
+
+    # queues a game and returns its offset in the stream
+    def write(self, moves, first=PLAYER):
+        record = encode(moves, first)
+        offset = self.offset
+        self.buffer += record
+        self.offset += len(record)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+        return offset
+
+    def flush(self):
+        if self.buffer:
+            self.file.write(self.buffer)
+            self.buffer.clear()
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class GameReader:
+
+    # memory-mapped stream, games are decoded one at a time as they are
+    # iterated so that any number of them can be replayed in constant memory
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            check_header(self.data, path)
+        except ValueError:
+            self.close()
+            raise
+
+    # (first, moves, offset of the next game) of the game at offset, or None
+    # past the end and for a record cut short by a crashed writer
+    def game_at(self, offset):
+        data = self.data
+        if offset >= len(data):
+            return None
+        header = data[offset]
+        count = header & COUNT_MASK
+        start = offset + 1
+        end = start + packed_size(count)
+        if end > len(data):
+            return None
+        packed = int.from_bytes(data[start:end], "little")
+        moves = [(packed >> (MOVE_BITS * i)) & 7 for i in range(count)]
+        return (AI if header & FIRST_AI else PLAYER), moves, end
+
+    # offset just past the last complete game of the stream
+    def end(self):
+        offset = HEADER.size
+        while True:
+            game = self.game_at(offset)
+            if game is None:
+                return offset
+            offset = game[2]
+
+    # yields (offset, first, moves) of every game in the stream
+    def __iter__(self):
+        offset = HEADER.size
+        while True:
+            game = self.game_at(offset)
+            if game is None:
+                return
+            first, moves, next_offset = game
+            yield offset, first, moves
+            offset = next_offset
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# yields (position, player to move) after every move of a game, the same
+# Bitboard updated in place
+def replay(moves, first=PLAYER, geometry=Rules.STANDARD):
+    position = Bitboard.Bitboard(geometry)
+    player = first
+    for move in moves:
+        position.play(move, player)
+        player = AI if player == PLAYER else PLAYER
+        yield position, player
+
+# writes an index of every position reached in the games of reader (after
+# at most plies moves of each game if given) to path: canonical keys and the
+# offsets of the games reaching them, sorted by key; keys take 64 bits, so
+# only boards with geometry.fits_uint64 can be indexed
+def build_index(reader, path, plies=None, geometry=Rules.STANDARD):
+    # 16 bytes per position until sorted
+    keys = array.array("Q")
+    offsets = array.array("Q")
+    for offset, first, moves in reader:
+        for position, player in replay(moves[:plies], first, geometry):
+            keys.append(position.canonical_key(player)[0])
+            offsets.append(offset)
+    keys = np.frombuffer(keys, dtype=np.uint64)
+    offsets = np.frombuffer(offsets, dtype=np.uint64)
+    order = np.lexsort((offsets, keys))
+    with open(path, "wb") as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(keys)))
+        f.write(keys[order].tobytes())
+        f.write(offsets[order].tobytes())
+    return len(keys)
+
+class PositionIndex:
+
+    # memory-mapped index written by build_index; keys only tell the pieces
+    # of the side to move from the others, so a position, its mirror image
+    # and its color swap share their entries
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            magic, self.size = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+        if magic != INDEX_MAGIC or os.path.getsize(path) != INDEX_HEADER.size + 16 * self.size:
+            raise ValueError(f"{path} is not a position index")
+        if self.size:
+            self.keys = np.memmap(path, dtype=np.uint64, mode="r", offset=INDEX_HEADER.size, shape=(self.size,))
+            self.offsets = np.memmap(path, dtype=np.uint64, mode="r", offset=INDEX_HEADER.size + 8 * self.size, shape=(self.size,))
+        else: # numpy cannot map an empty range
+            self.keys = self.offsets = np.zeros(0, dtype=np.uint64)
+
+    # offsets of the games reaching position with player to move
+    def lookup(self, position, player):
+        key = np.uint64(position.canonical_key(player)[0])
+        low = np.searchsorted(self.keys, key, side="left")
+        high = np.searchsorted(self.keys, key, side="right")
+        return [int(offset) for offset in self.offsets[low:high]]
+
+    def __len__(self):
+        return self.size
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Game record streams")
+    commands = parser.add_subparsers(dest="command", required=True)
+    stats_parser = commands.add_parser("stats", help="count the games of a stream")
+    stats_parser.add_argument("records")
+    index_parser = commands.add_parser("index", help="index the positions of a stream")
+    index_parser.add_argument("records")
+    index_parser.add_argument("output")
+    index_parser.add_argument("--plies", type=int, help="only index the first moves of every game")
+    index_parser.add_argument("--board", default="7x6", help="board size of the games as COLSxROWS")
+    args = parser.parse_args()
+    if args.command == "index":
+        try:
+            geometry = Rules.parse(args.board)
+        except ValueError as e:
+            parser.error(str(e))
+        if not geometry.fits_uint64:
+            parser.error(f"{geometry.name} position keys do not fit in 64 bits")
+        if not supports(geometry):
+            parser.error(f"{geometry.name} games do not fit in game records")
+    t0 = time.time()
+    with GameReader(args.records) as reader:
+        if args.command == "stats":
+            games = 0
+            moves = 0
+            for _, _, game_moves in reader:
+                games += 1
+                moves += len(game_moves)
+            size = os.path.getsize(args.records)
+            print(f"{games} games, {moves / max(games, 1):.1f} moves and {(size - HEADER.size) / max(games, 1):.1f} bytes per game, read in {time.time() - t0:.1f}s")
+        else:
+            count = build_index(reader, args.output, args.plies, geometry)
+            print(f"{count} positions indexed in {time.time() - t0:.1f}s")
@@ -1,24 +1,22 @@
+import functools
 import math
 import numpy as np
 import pygame as pg
 import sys
-
-# board dimensions
-ROW = 6
-COL = 7
+import threading
+import time
+import Bitboard
+import Rules
+from Rules import EMPTY, PLAYER, AI
 
 # pygame dimensions
-WINDOW_WIDTH = 700
-WINDOW_HEIGHT = 700
 SQUARESIZE = 100
-WIDTH = COL * SQUARESIZE
-HEIGHT = (ROW+1) * SQUARESIZE
 RADIUS = int(SQUARESIZE/2 - 5)
 
-# players
-EMPTY = 0
-PLAYER = 1
-AI = 2
+# frames per second of the window, and speed of a falling piece in pixels
+# per second (one row every 100 ms)
+FPS = 60
+DROP_SPEED = 10 * SQUARESIZE
 
 # colors
 BLACK = (0, 0, 0)
@@ -26,19 +24,44 @@ BLUE = (0, 0, 255)
 RED = (255, 0, 0)
 YELLOW = (255, 255, 0)
 LIGHT_GREY = (200, 200, 200)
+# colorkey of the holes in the board overlay, never drawn
+HOLE = (255, 0, 255)
 
-# pygame inits
-pg.init()
-myfont = pg.font.SysFont("monospace", 75)
+# font of the messages, loaded by the first one shown
+@functools.lru_cache(maxsize=None)
+def message_font():
+    return pg.font.SysFont("monospace", 75)
 
 class Gameboard:
 
-    def __init__(self, ai):
-        self.state = np.zeros((ROW, COL), dtype=int)
+    # The board is drawn in layers: the pieces on a black background and on
+    # top of them the blue overlay with a hole per cell, rendered once. Only
+    # the regions that changed since the last frame are redrawn and passed to
+    # pg.display.update(rects), a falling piece is moved a little every frame
+    # and the engine searches in a background thread, so the window keeps its
+    # frame rate while the engine thinks and pieces drop.
+
+    def __init__(self, ai, geometry=Rules.STANDARD):
+        self.geometry = geometry
+        # window size, one row of squares above the board for the next piece
+        self.width = geometry.cols * SQUARESIZE
+        self.height = (geometry.rows + 1) * SQUARESIZE
+        self.state = np.zeros((geometry.rows, geometry.cols), dtype=int)
         self.screen = self.setup(ai)
+        self.overlay = self.render_overlay()
+        # (row, col, player, start time) of the piece being dropped, its cell
+        # is already set in state but drawn empty until the piece lands
+        self.falling = None
+        # y of the falling piece's center at the last frame
+        self.falling_y = None
+        # regions to update at the end of the frame
+        self.dirty = []
+        self.clock = pg.time.Clock()
 
     def setup(self, ai):
-        screen = pg.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+        # pygame is initialized by the first window, not when this module loads
+        pg.init()
+        screen = pg.display.set_mode((self.width, self.height))
         caption = 'Connect 4: ' + ai
         pg.display.set_caption(caption)
 
@@ -46,45 +69,168 @@ class Gameboard:
         screen.fill(BLACK)
 
         # Draw the board background
-        pg.draw.rect(screen, BLUE, (0, SQUARESIZE, WIDTH, HEIGHT - SQUARESIZE))
+        pg.draw.rect(screen, BLUE, (0, SQUARESIZE, self.width, self.height - SQUARESIZE))
 
         # Return the surface
         return screen
 
+    # blue board with a transparent hole per cell
+    def render_overlay(self):
+        overlay = pg.Surface((self.width, self.height - SQUARESIZE))
+        overlay.fill(BLUE)
+        overlay.set_colorkey(HOLE)
+        for c in range(self.geometry.cols):
+            for r in range(self.geometry.rows):
+                pg.draw.circle(overlay, HOLE, (int(c * SQUARESIZE + SQUARESIZE / 2), int(r * SQUARESIZE + SQUARESIZE / 2)), RADIUS)
+        return overlay.convert()
+
+    def cell_rect(self, row, col):
+        return pg.Rect(col * SQUARESIZE, row * SQUARESIZE + SQUARESIZE, SQUARESIZE, SQUARESIZE)
+
+    # draws cell (row, col) as it is in state and marks it dirty
+    def draw_cell(self, row, col):
+        rect = self.cell_rect(row, col)
+        self.screen.fill(BLACK, rect)
+        piece = self.state[row][col]
+        if piece != EMPTY and not (self.falling and self.falling[:2] == (row, col)):
+            pg.draw.circle(self.screen, RED if piece == PLAYER else YELLOW, rect.center, RADIUS)
+        self.screen.blit(self.overlay, rect, rect.move(0, -SQUARESIZE))
+        self.dirty.append(rect)
+
+    # redraws the whole window at once
     def draw_board(self):
-        # draw board
-        for c in range(COL):
-            for r in range(ROW):
-                pg.draw.rect(self.screen, BLUE, (c * SQUARESIZE, r * SQUARESIZE + SQUARESIZE, SQUARESIZE, SQUARESIZE))
-        
-        # draw checker pieces
-        for c in range(COL):
-            for r in range(ROW):
-                if self.state[r][c] == PLAYER:
-                    pg.draw.circle(self.screen, RED, (int(c * SQUARESIZE + SQUARESIZE / 2), int(r * SQUARESIZE + SQUARESIZE / 2 + 100)), RADIUS)
-                elif self.state[r][c] == AI:
-                    pg.draw.circle(self.screen, YELLOW, (int(c * SQUARESIZE + SQUARESIZE / 2), int(r * SQUARESIZE + SQUARESIZE / 2 + 100)), RADIUS)
-                else:
-                    pg.draw.circle(self.screen, BLACK, (int(c * SQUARESIZE + SQUARESIZE / 2), int(r * SQUARESIZE + SQUARESIZE + SQUARESIZE / 2)), RADIUS)
-        
+        self.screen.fill(BLACK, (0, 0, self.width, SQUARESIZE))
+        for c in range(self.geometry.cols):
+            for r in range(self.geometry.rows):
+                self.draw_cell(r, c)
+        self.dirty.clear()
         pg.display.update()
 
+    # shows the next piece of player above column x, or nothing if player is None
+    def draw_hover(self, x, player):
+        rect = pg.Rect(0, 0, self.width, SQUARESIZE)
+        self.screen.fill(BLACK, rect)
+        if player is not None:
+            pg.draw.circle(self.screen, RED if player == PLAYER else YELLOW, (x, int(SQUARESIZE/2)), RADIUS)
+        self.dirty.append(rect)
+
+    # moves the falling piece to where it is at time now, lands it once it
+    # reaches its cell
+    def animate(self, now):
+        row, col, player, start = self.falling
+        target_y = int(row * SQUARESIZE + SQUARESIZE + SQUARESIZE / 2)
+        y = min(int(SQUARESIZE / 2 + (now - start) * DROP_SPEED), target_y)
+        x = col * SQUARESIZE
+        # the strip of the column swept since the last frame
+        top = min(y, self.falling_y) - SQUARESIZE // 2
+        strip = pg.Rect(x, top, SQUARESIZE, abs(y - self.falling_y) + SQUARESIZE)
+        self.falling_y = y
+        if y == target_y:
+            self.falling = None
+        self.screen.fill(BLACK, strip)
+        if self.falling:
+            pg.draw.circle(self.screen, RED if player == PLAYER else YELLOW, (x + SQUARESIZE // 2, y), RADIUS)
+        board_part = strip.clip(pg.Rect(0, SQUARESIZE, self.width, self.height - SQUARESIZE))
+        if board_part:
+            self.screen.blit(self.overlay, board_part, board_part.move(0, -SQUARESIZE))
+        self.dirty.append(strip)
+        if not self.falling:
+            self.draw_cell(row, col)
+
+    # pushes the regions drawn since the last frame to the display and waits
+    # for the next frame
+    def end_frame(self):
+        if self.dirty:
+            pg.display.update(self.dirty)
+            self.dirty.clear()
+        self.clock.tick(FPS)
+
+    # drops player's piece in col one frame at a time until it lands, the
+    # piece of the previous move must have landed
+    def drop_piece(self, row, col, player):
+        self.state[row][col] = PLAYER if player == PLAYER else AI
+        self.falling = (row, col, player, time.perf_counter())
+        self.falling_y = SQUARESIZE // 2
+        self.draw_hover(0, None)
+
+    # returns the column the human clicked, if any, and shows the piece
+    # above the column under the mouse; may_play is false while the engine
+    # is to move or a piece is falling
+    def handle_events(self, may_play):
+        action = None
+        for event in pg.event.get():
+            if event.type == pg.QUIT:
+                sys.exit()
+
+            if event.type == pg.MOUSEMOTION and may_play:
+                self.draw_hover(event.pos[0], PLAYER)
+
+            if event.type == pg.MOUSEBUTTONDOWN and may_play and action is None:
+                col = int(math.floor(event.pos[0]/SQUARESIZE))
+                if col in self.get_available_actions():
+                    action = col
+        return action
+
+    # plays a game between the human and engine, p1 moving first. The
+    # engine searches its moves in a thread and ponders during the human's,
+    # the window is redrawn every frame meanwhile
+    def play_game(self, engine, p1):
+        position = Bitboard.Bitboard.from_state(self.state)
+        engine.set_position(position, p1)
+        player = p1
+        game_over = self.is_game_over()
+        search = None if game_over else self.start_turn(engine, position, player)
+        try:
+            while self.falling or not game_over:
+                action = self.handle_events(player == PLAYER and not game_over and not self.falling)
+                if search is not None and not self.falling and not search.is_alive():
+                    if search.error is not None:
+                        raise search.error
+                    action = search.result[0]
+                if action is not None:
+                    search = None
+                    engine.stop_pondering()
+                    self.drop_piece(self.get_next_open_row(action), action, player)
+                    engine.play(action, player)
+                    position.play(action, player)
+                    game_over = position.winning_move(player) or position.is_full()
+                    player = AI if player == PLAYER else PLAYER
+                    if not game_over:
+                        search = self.start_turn(engine, position, player)
+                if self.falling:
+                    self.animate(time.perf_counter())
+                self.end_frame()
+        finally:
+            engine.stop_pondering()
+            if search is not None:
+                search.join()
+            engine.close()
+
+    # starts the engine's search in a thread if player is the engine, or its
+    # pondering during the human's move; returns the search thread, or None.
+    # Once it is done, its result attribute holds (move, stats), or its
+    # error attribute the exception best_move raised
+    def start_turn(self, engine, position, player):
+        if player != AI:
+            engine.start_pondering(player)
+            return None
+        def run():
+            try:
+                search.result = engine.best_move(position.copy(), player)
+            except BaseException as e:
+                search.error = e
+        search = threading.Thread(target=run, daemon=True)
+        search.error = None
+        search.start()
+        return search
+
     def print_state(self):
         for row in self.state:
             print(" ".join(str(int(cell)) for cell in row))
 
-    # only changes state and doesnt get new child
-    def drop_piece(self, row, col, player):
-        for i in range(row+1):
-            if i != 0:
-                self.state[i-1][col] = EMPTY
-            self.state[i][col] = PLAYER if player == PLAYER else AI
-            self.draw_board()
-            pg.time.wait(100)
-
     # returns next open row in a certain column
     def get_next_open_row(self, col):
-        for i in range(ROW-1, -1, -1):
+        for i in range(self.geometry.rows-1, -1, -1):
             if self.state[i][col] == EMPTY:
                 return i
 
@@ -94,55 +240,14 @@ class Gameboard:
     
     # possible winning moves
     def winning_move(self, player):
-        # Check horizontal locations for win
-        for c in range(COL-3):
-            for r in range(ROW):
-                if self.state[r][c] == player and self.state[r][c+1] == player and self.state[r][c+2] == player and self.state[r][c+3] == player:
-                    return True
-        # Check vertical locations for win
-        for c in range(COL):
-            for r in range(ROW-3):
-                if self.state[r][c] == player and self.state[r+1][c] == player and self.state[r+2][c] == player and self.state[r+3][c] == player:
-                    return True
-        # Check negatively sloped diaganols
-        for c in range(COL-3):
-            for r in range(ROW-3):
-                if self.state[r][c] == player and self.state[r+1][c+1] == player and self.state[r+2][c+2] == player and self.state[r+3][c+3] == player:
-                    return True
-        # Check positively sloped diaganols
-        for c in range(COL-3):
-            for r in range(3, ROW):
-                if self.state[r][c] == player and self.state[r-1][c+1] == player and self.state[r-2][c+2] == player and self.state[r-3][c+3] == player:
-                    return True
-                
+        return Bitboard.Bitboard.from_state(self.state).winning_move(player)
+
     # returns indeces of valid columns
     def get_available_actions(self):
-        return [c for c in range(COL) if any(self.state[:, c] == 0)]
-    
-    def player_input(self):
-        for event in pg.event.get():
-            if event.type == pg.QUIT:
-                sys.exit()
-
-            if event.type == pg.MOUSEMOTION:
-                pg.draw.rect(self.screen, BLACK, (0, 0, WIDTH, SQUARESIZE))
-                posx = event.pos[0]
-                pg.draw.circle(self.screen, RED, (posx, int(SQUARESIZE/2)), RADIUS)
-                pg.display.update()
-
-            if event.type == pg.MOUSEBUTTONDOWN:
-                pg.draw.rect(self.screen, BLACK, (0, 0, WIDTH, SQUARESIZE))  
-                posx = event.pos[0]
-                action = (int(math.floor(posx/SQUARESIZE)))
-                if action in self.get_available_actions():
-                    row = self.get_next_open_row(action)
-                    self.drop_piece(row, action, PLAYER)
-                    return True, action
-                
-        return False, None
+        return [c for c in range(self.geometry.cols) if any(self.state[:, c] == 0)]
     
     def display(self, label, x, y, color):
-        label = myfont.render(label, 1, color)
+        label = message_font().render(label, 1, color)
         self.screen.blit(label, (x,y))
         pg.display.update()
 
@@ -156,8 +261,3 @@ class Gameboard:
     
     def is_game_over(self):
         return not self.empty_spaces() or self.winning_move(AI) or self.winning_move(PLAYER)
-    
-    def close_window(self):
-        for event in pg.event.get():
-            if event.type == pg.QUIT:
-                return True
\ No newline at end of file
@@ -1,190 +1,362 @@
+import functools
 import math
 import random
 import sys
 import time
+import Bitboard
+import Engine
+import NodePool
 import utils
+from Rules import EMPTY, PLAYER, AI
 
-# players
-EMPTY = 0
-PLAYER = 1
-AI = 2
+BALANCE_FACTOR = 1
 
-# board dimensions
-ROW = 6
-COL = 7
+# plays a random game in place on state, opp being the player who made the
+# last move; returns the winner or None for a draw
+def rollout(state, opp):
+    player = AI if opp == PLAYER else PLAYER
+    is_terminal = utils.is_terminal_node(state, opp)
 
-# colors
-BLACK = (0, 0, 0)
-BLUE = (0, 0, 255)
-RED = (255, 0, 0)
-YELLOW = (255, 255, 0)
-LIGHT_GREY = (200, 200, 200)
+    while not is_terminal:
+        actions_available = state.get_available_actions()
+        if not len(actions_available):
+            return None # its a draw
+        else:
+            for action in actions_available:
+                # simulate dropping a piece
+                state.play(action, player)
+                if state.winning_move(player):
+                    return player
+                state.undo(action, player)
+            # to move to next state
+            action = random.choice(actions_available)
+            state.play(action, player)
+        opp = player
+        player = AI if player == PLAYER else PLAYER
 
-BALANCE_FACTOR = 1
+    return opp # default in case the state is terminal
+
+# weight of every cell (by bit index) in heavy playouts: the number of
+# four-cell windows through it, 3 in the corners up to 13 in the center of
+# the standard board
+@functools.lru_cache(maxsize=None)
+def cell_weights(geometry):
+    weights = [0] * geometry.bits
+    for window in geometry.windows:
+        while window:
+            low = window & -window
+            weights[low.bit_length() - 1] += 1
+            window ^= low
+    return weights
+
+# plays a game in place on state like rollout, every move chosen by a
+# tactical policy: win if possible, else block the opponent's win, else a
+# random move weighted by cell_weights among those that do not let the
+# opponent win on top of them. Threats are found with bit operations
+# (Geometry.winning_cells), and a game decided by the policy's next moves
+# is scored without playing them
+def heavy_rollout(state, opp):
+    if state.winning_move(opp):
+        return opp
+    geometry = state.geometry
+    weights = cell_weights(geometry)
+    height = geometry.height
+    bottom_mask = geometry.bottom_mask
+    board_mask = geometry.board_mask
+    winning_cells = geometry.winning_cells
+    boards = state.boards
+    player = AI if opp == PLAYER else PLAYER
+    while True:
+        mask = boards[PLAYER] | boards[AI]
+        playable = (mask + bottom_mask) & board_mask
+        if not playable:
+            return None # its a draw
+        if winning_cells(boards[player], mask) & playable:
+            return player
+        threats = winning_cells(boards[opp], mask)
+        forced = threats & playable
+        if forced:
+            if forced & (forced - 1):
+                return opp # two threats, only one can be blocked
+            cell = forced
+        else:
+            # cells right below an opponent's threat would let them play it
+            candidates = playable & ~(threats >> 1)
+            if not candidates:
+                return opp
+            cells = []
+            total = 0
+            while candidates:
+                low = candidates & -candidates
+                candidates ^= low
+                cells.append(low)
+                total += weights[low.bit_length() - 1]
+            pick = random.random() * total
+            for cell in cells:
+                pick -= weights[cell.bit_length() - 1]
+                if pick < 0:
+                    break
+        state.play((cell.bit_length() - 1) // height, player)
+        opp, player = player, opp
+
+# playout functions by name
+ROLLOUTS = {"light": rollout, "heavy": heavy_rollout}
+
+class MCTS(Engine.Engine):
+
+    def __init__(self, time_limit=5, rollouts_per_leaf=1, book=None, balance_factor=BALANCE_FACTOR, rollout_policy="light"):
+        super().__init__(book)
+        self.time_limit = time_limit
+        # exploration weight of UCT
+        self.balance_factor = balance_factor
+        # playouts run per expanded leaf, more than one uses BatchRollout
+        self.rollouts_per_leaf = rollouts_per_leaf
+        # "light" (random but for immediate wins) or "heavy" playouts
+        if rollout_policy not in ROLLOUTS:
+            raise ValueError(f"unknown rollout policy {rollout_policy!r}, expected one of {', '.join(ROLLOUTS)}")
+        if rollout_policy != "light" and rollouts_per_leaf > 1:
+            raise ValueError("batched playouts are light only")
+        self.rollout_policy = rollout_policy
+        self.rollout = ROLLOUTS[rollout_policy]
+        self.set_position(Bitboard.Bitboard(), PLAYER)
 
-class MCTS:
-
-    def __init__(self, game_board, p1):
-        self.game_board = game_board
-        self.root_node_id = (0,)
-        self.tree = {self.root_node_id: 
-                        {"state": self.game_board.state, 
-                         "player": None, 
-                         "parent": None, 
-                         "action": None, 
-                         "children": [],
-                         "wins": 0,
-                         "visits": 0
-                         }
-                    }
-        self.time_limit = 5
+    def set_position(self, position, player):
+        if self.rollouts_per_leaf > 1:
+            # numpy playouts only take boards that fit in 64 bits
+            import BatchRollout
+            BatchRollout.tables(position.geometry)
+        # position of the root node, tree nodes only store their move
+        self.board = position.copy()
+        self.pool = NodePool.NodePool()
+        # the root's player is the one who moved last
+        self.root_node_id = self.pool.new_node(NodePool.NO_NODE, -1, AI if player == PLAYER else PLAYER)
         self.total_visits = 0
-        self.p1 = p1
-        self.start_game()
-
-    def start_game(self):           
-        root_node_id = self.root_node_id
-        current_node_id = root_node_id
-        prev_player = self.tree[root_node_id]["player"] 
-        player = self.p1
-        while not self.game_board.is_game_over():
-            if self.game_board.close_window():
-                sys.exit()
-            if player == AI:
-                t0 = time.time()
-                while time.time() - t0 < self.time_limit:
-                    self.think(current_node_id, player)
-
-                children = self.tree[current_node_id]["children"]
-                if not children:
-                    utils.generate_children(self, current_node_id, player)
-                total_visits = -math.inf
-                for child_id in children:
-                    action = self.tree[child_id]["action"]
-                    visits = self.tree[child_id]["visits"]
-                    if visits > total_visits:
-                        total_visits = visits
-                        best_action = action
-                col = (best_action,)
-                row = self.game_board.get_next_open_row(col)
-                self.game_board.drop_piece(row, col, player)
-                current_node_id += (best_action,)
-            else:
-                while True:
-                    self.think(current_node_id, PLAYER)
-                    if not self.tree[current_node_id]["children"]:
-                        utils.generate_children(self, current_node_id, player)
-                    exit, action = self.game_board.player_input()
-                    if exit:
-                        break
-                current_node_id += (action,)
-            prev_player = player
-            player = AI if prev_player == PLAYER else PLAYER
-        self.game_board.display_winner()
-
-    def think(self, current_node_id, player):
-        selected_node_id = self.selection(current_node_id)
-        expanded_node = self.expansion(selected_node_id, player)
-        winner = self.simulation(expanded_node)
-        self.backpropagation(expanded_node, winner)
-
-    def uct(self, node_id):
-        if not self.total_visits: # node_id is root doesnt have parent
-            return math.inf
-        parent_id = self.tree[node_id]["parent"]
-        parent_visits = self.tree[parent_id]["visits"]
-        wins = self.tree[node_id]["wins"]
-        visits = self.tree[node_id]["visits"]
-        small_value = sys.float_info.epsilon
-        exploitation = wins / (visits + small_value)
-        exploration = math.sqrt(math.log(parent_visits + small_value) / (visits + small_value))
-        return exploitation + BALANCE_FACTOR * exploration
 
-    def selection(self, current_node_id):
-        is_terminal = False
-        leaf_node_id = current_node_id
-        while not is_terminal:
-            num_children = len(self.tree[leaf_node_id]['children'])
-            if not num_children:
-                is_terminal = True
-            else:
-                best_score = -math.inf
-                child_score = -math.inf
-                best_actions = {}
-                for child_id in self.tree[leaf_node_id]["children"]:
-                    action = self.tree[child_id]["action"]
-                    child_score = self.uct(child_id)
-                    if child_score > best_score:
-                        best_score = child_score
-                        best_actions = {action: child_score}
-                    elif child_score == best_score:
-                        best_actions[action] = child_score
-                best_action = random.choice(list(best_actions.keys()))
-                leaf_node_id += (best_action,)
-        return leaf_node_id
-    
-    def expansion(self, selected_node_id, player):
-        state = self.tree[selected_node_id]["state"]
-        if selected_node_id != self.root_node_id:
-            opp = self.tree[selected_node_id]["player"]
-            player = AI if opp == PLAYER else PLAYER
+    # the tree is only kept when its root has player to move
+    def in_sync(self, position, player):
+        return super().in_sync(position, player) and self.pool.player[self.root_node_id] != player
+
+    def best_move(self, position, player, budget=None):
+        if not self.in_sync(position, player):
+            self.set_position(position, player)
+        book_move = self.book_move(position, player)
+        if book_move is not None:
+            return book_move
+        observed = self.begin_stats(player)
+        nodes = self.pool.size
+        t0 = time.time()
+        playouts = self.search(self.root_node_id, budget, observed)
+        action = self.best_action(self.root_node_id, player)
+        if observed is not None:
+            observed.playouts = playouts
+            observed.nodes = self.pool.size - nodes
+            observed.pv = self.principal_variation(self.root_node_id) or [action]
+            self.end_stats(observed, action)
+        stats = {
+            "playouts": playouts,
+            "nodes": self.pool.size,
+            "root_visits": self.pool.visits[self.root_node_id],
+            "bytes_per_node": self.pool.bytes_per_node(),
+            "memory_bytes": self.pool.memory_usage(),
+            "time": time.time() - t0,
+        }
+        return action, stats
+
+    def play(self, move, player):
+        self.advance(self.root_node_id, move, player)
+
+    # grows the tree of the current position, play() then keeps the subtree
+    # of the move the opponent actually made
+    def ponder(self, player, stop):
+        while not stop.is_set():
+            self.think(self.root_node_id)
+
+    # runs playouts from current_node_id for time_limit seconds (the engine's
+    # own if None), returns the number of playouts; phases are only timed
+    # when a SearchStats is given
+    def search(self, current_node_id, time_limit=None, stats=None):
+        if time_limit is None:
+            time_limit = self.time_limit
+        playouts = 0
+        t0 = time.time()
+        if stats is None:
+            while time.time() - t0 < time_limit:
+                self.think(current_node_id)
+                playouts += 1
         else:
-            opp = PLAYER if self.p1 == AI else AI
-        is_terminal_node = utils.is_terminal_node(state, opp)
+            while time.time() - t0 < time_limit:
+                self.think_profiled(current_node_id, stats)
+                playouts += 1
+                stats.playouts = playouts
+                self.sample(stats)
+        return playouts
+
+    # most visited move from current_node_id
+    def best_action(self, current_node_id, player):
+        utils.generate_children(self.pool, current_node_id, self.board, player)
+        total_visits = -math.inf
+        for child_id in self.pool.children(current_node_id):
+            visits = self.pool.visits[child_id]
+            if visits > total_visits:
+                total_visits = visits
+                best_action = self.pool.move[child_id]
+        return best_action
 
-        if not is_terminal_node:
-            utils.generate_children(self, selected_node_id, player)
+    # moves along the most visited children from current_node_id
+    def principal_variation(self, current_node_id):
+        pool = self.pool
+        pv = []
+        node_id = current_node_id
+        while pool.first_child[node_id] != NodePool.NO_NODE:
+            node_id = max(pool.children(node_id), key=lambda child_id: pool.visits[child_id])
+            if not pool.visits[node_id]:
+                break
+            pv.append(pool.move[node_id])
+        return pv
 
-        if not self.tree[selected_node_id]["children"]: # lead node
+    # plays action and re-roots the tree on the resulting node, keeping its
+    # subtree and freeing every branch that can no longer be reached
+    def advance(self, current_node_id, action, player):
+        utils.generate_children(self.pool, current_node_id, self.board, player)
+        child_id = self.pool.find_child(current_node_id, action)
+        self.pool = self.pool.subtree(child_id)
+        self.root_node_id = 0
+        self.board.play(action, player)
+        return self.root_node_id
+
+    def think(self, current_node_id):
+        path, state = self.selection(current_node_id)
+        expanded_node = self.expansion(path[-1], state)
+        if expanded_node != path[-1]:
+            path.append(expanded_node)
+        if self.rollouts_per_leaf > 1:
+            wins = self.simulation_batch(expanded_node, state, self.rollouts_per_leaf)
+            self.backpropagation_batch(path, wins)
+        else:
+            winner = self.simulation(expanded_node, state)
+            self.backpropagation(path, winner)
+
+    # think() with the time of every phase added to stats.phase_times
+    def think_profiled(self, current_node_id, stats):
+        times = stats.phase_times
+        t0 = time.perf_counter()
+        path, state = self.selection(current_node_id)
+        t1 = time.perf_counter()
+        expanded_node = self.expansion(path[-1], state)
+        if expanded_node != path[-1]:
+            path.append(expanded_node)
+        t2 = time.perf_counter()
+        if self.rollouts_per_leaf > 1:
+            wins = self.simulation_batch(expanded_node, state, self.rollouts_per_leaf)
+            t3 = time.perf_counter()
+            self.backpropagation_batch(path, wins)
+        else:
+            winner = self.simulation(expanded_node, state)
+            t3 = time.perf_counter()
+            self.backpropagation(path, winner)
+        t4 = time.perf_counter()
+        times["selection"] += t1 - t0
+        times["expansion"] += t2 - t1
+        times["simulation"] += t3 - t2
+        times["backpropagation"] += t4 - t3
+        if len(path) - 1 > stats.max_depth:
+            stats.max_depth = len(path) - 1
+
+    # walks down the tree from current_node_id by UCT and returns the path of
+    # nodes visited (current_node_id to the first node not fully expanded)
+    # together with that node's position, rebuilt from the current board
+    def selection(self, current_node_id):
+        pool = self.pool
+        visits = pool.visits
+        wins = pool.wins
+        first_child = pool.first_child
+        next_sibling = pool.next_sibling
+        untried = pool.untried
+        small_value = sys.float_info.epsilon
+        balance_factor = self.balance_factor
+        state = self.board.copy()
+        leaf_node_id = current_node_id
+        path = [leaf_node_id]
+        # stops at the first node with untried moves (or none yet generated)
+        while not untried[leaf_node_id] and first_child[leaf_node_id] != NodePool.NO_NODE:
+            best_score = -math.inf
+            best_children = []
+            log_parent_visits = math.log(visits[leaf_node_id] + small_value)
+            child_id = first_child[leaf_node_id]
+            while child_id != NodePool.NO_NODE:
+                if not self.total_visits: # no statistics yet
+                    child_score = math.inf
+                else:
+                    child_visits = visits[child_id] + small_value
+                    exploitation = wins[child_id] / child_visits
+                    exploration = math.sqrt(log_parent_visits / child_visits)
+                    child_score = exploitation + balance_factor * exploration
+                if child_score > best_score:
+                    best_score = child_score
+                    best_children = [child_id]
+                elif child_score == best_score:
+                    best_children.append(child_id)
+                child_id = next_sibling[child_id]
+            leaf_node_id = best_children[0] if len(best_children) == 1 else random.choice(best_children)
+            state.play(pool.move[leaf_node_id], pool.player[leaf_node_id])
+            path.append(leaf_node_id)
+        return path, state
+
+    # adds one child of the selected node, a winning move first, and plays
+    # its move on state; a terminal or fully expanded node is returned as is
+    def expansion(self, selected_node_id, state):
+        pool = self.pool
+        opp = pool.player[selected_node_id]
+        player = AI if opp == PLAYER else PLAYER
+        child_id = utils.generate_child(pool, selected_node_id, state, player)
+        if child_id == NodePool.NO_NODE: # leaf node
             return selected_node_id
-        
-        best_actions = []
-        for child_id in self.tree[selected_node_id]["children"]:
-            action = self.tree[child_id]["action"]
-            child_state = self.tree[child_id]["state"]
-            if utils.winning_move(child_state, player):
-                return selected_node_id + (action,)
-            best_actions.append(action)
-
-        return selected_node_id + (random.choice(best_actions),)
-
-    def simulation(self, expanded_node_id):
+        state.play(pool.move[child_id], player)
+        return child_id
+
+    def simulation(self, expanded_node_id, state):
         self.total_visits += 1
-        node_id = expanded_node_id
-        state = self.tree[node_id]["state"]
-        opp = self.tree[node_id]["player"]
-        player = AI if opp == PLAYER else PLAYER
-        is_terminal = utils.is_terminal_node(state, opp)
-
-        while not is_terminal:
-            actions_available = utils.get_available_actions(state)
-            if not len(actions_available):
-                return None # its a draw
-            else:
-                actions = []
-                for action in actions_available:
-                    # simulate dropping a piece
-                    child_state = utils.drop_piece(state, action, player)
-                    if utils.winning_move(child_state, player):
-                        return player
-                    actions.append(action)
-                # to move to next state
-                action = random.choice(actions)
-                state = utils.drop_piece(state, action, player)
-            opp = player
-            player = AI if player == PLAYER else PLAYER
-
-        return opp # default in case expanded node is terminal
-    
-    def backpropagation(self, node_id, winner):
-        player = self.tree[node_id]["player"]
-        opp = AI if player == PLAYER else PLAYER
-        self.tree[node_id]["visits"] += 1
-
-        if winner == player:
-            self.tree[node_id]["wins"] += 1
-        elif winner == opp:
-            self.tree[node_id]["wins"] -= 10
-
-        if node_id != self.root_node_id:
-            self.backpropagation(self.tree[node_id]["parent"], winner)
\ No newline at end of file
+        return self.rollout(state, self.pool.player[expanded_node_id])
+
+    # runs n playouts with BatchRollout (imported with numpy on first use),
+    # returns the number of playouts won by each player, index 0 for draws
+    def simulation_batch(self, expanded_node_id, state, n):
+        import numpy as np
+        import BatchRollout
+        self.total_visits += n
+        winners = BatchRollout.batch_rollout(state, self.pool.player[expanded_node_id], n)
+        return np.bincount(winners, minlength=3)
+
+    # backpropagation of a whole batch along path, wins[p] being the number
+    # of playouts won by p
+    def backpropagation_batch(self, path, wins):
+        pool = self.pool
+        visits = int(wins.sum())
+        # playouts won and lost by the player who moved into the node, from
+        # the leaf upwards the two swap at every level
+        player = pool.player[path[-1]]
+        won = int(wins[player])
+        lost = int(wins[AI if player == PLAYER else PLAYER])
+        for node_id in reversed(path):
+            pool.visits[node_id] += visits
+            pool.wins[node_id] += won - 10 * lost
+            won, lost = lost, won
+
+    # updates every node of path in a single pass from the leaf up
+    def backpropagation(self, path, winner):
+        pool = self.pool
+        visits = pool.visits
+        wins = pool.wins
+        # +1 if the player who moved into the node won, -1 if they lost,
+        # negated at every level
+        if winner is None or winner == EMPTY:
+            sign = 0
+        else:
+            sign = 1 if winner == pool.player[path[-1]] else -1
+        for node_id in reversed(path):
+            visits[node_id] += 1
+            if sign > 0:
+                wins[node_id] += 1
+            elif sign < 0:
+                wins[node_id] -= 10
+            sign = -sign
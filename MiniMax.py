@@ -1,117 +1,227 @@
 import math
-import random
-import sys
-import utils
-
-# players
-EMPTY = 0
-PLAYER = 1
-AI = 2
-
-# board dimensions
-ROW = 6
-COL = 7
-
-# colors
-BLACK = (0, 0, 0)
-BLUE = (0, 0, 255)
-RED = (255, 0, 0)
-YELLOW = (255, 255, 0)
-LIGHT_GREY = (200, 200, 200)
-
-class MiniMax():
-
-    def __init__(self, game_board, p1, depth=5):
-        self.game_board = game_board
-        self.root_node_id = (0,)
-        self.tree = {self.root_node_id: 
-                        {"state": self.game_board.state, 
-                         "player": None, 
-                         "parent": None, 
-                         "action": None, 
-                         "children": []}
-                    }
-        self.p1 = p1
-        self.depth = depth
-        self.start_game(depth, maximize_player=AI)
-
-    def start_game(self, depth, maximize_player):
-        root_node_id = self.root_node_id
-        current_node_id = root_node_id
-        prev_player = self.tree[root_node_id]["player"]
-        player = self.p1
-        while not self.game_board.is_game_over():
-            if self.game_board.close_window():
-                sys.exit()
-            if player == maximize_player:
-                # AI's turn
-                action = self.minimax(depth, current_node_id, maximize_player, player)[0]
-                # Make the AI move
-                col = (action,)
-                row = self.game_board.get_next_open_row(col)
-                self.game_board.drop_piece(row, col, player)
-                current_node_id += (action,)
-            else:
-                while True:
-                    if not self.tree[current_node_id]["children"]:
-                        utils.generate_children(self, current_node_id, player)
-                    exit, action = self.game_board.player_input()
-                    if exit:
-                        break
-                current_node_id += (action,)
-            prev_player = player
-            player = AI if prev_player == PLAYER else PLAYER
-        self.game_board.display_winner()
-
-    def minimax(self, depth, current_node_id, maximize_player, player):
-        current_state = self.tree[current_node_id]["state"]
+import threading
+import time
+import Bitboard
+import Engine
+import Evaluator
+import TranspositionTable
+from Rules import PLAYER, AI
+
+# raised inside minimax once the time budget of the current move is spent
+class SearchTimeout(Exception):
+    pass
+
+class MiniMax(Engine.Engine):
+
+    def __init__(self, time_limit=2, max_depth=None, tt_size=1 << 20, book=None):
+        super().__init__(book)
+        self.time_limit = time_limit
+        # None searches up to the number of cells of the board
+        self.max_depth = max_depth
+        self.depth = 0 # deepest fully searched depth of the last move
+        self.score = 0 # score of the last move from the mover's side
+        self.nodes = 0
+        self.deadline = None
+        # set to abort the search early (pondering)
+        self.stop = threading.Event()
+        # shared by every move of the game
+        self.tt = TranspositionTable.TranspositionTable(tt_size)
+        # side whose scores are stored in the table
+        self.tt_player = None
+        # SearchStats of the move being searched while observed
+        self.search_stats = None
+        self.set_position(Bitboard.Bitboard(), PLAYER)
+
+    def set_position(self, position, player):
+        self.board = position.copy()
+        # heuristic score of self.board, kept in sync by play/undo
+        self.evaluator = Evaluator.Evaluator.from_board(self.board)
+
+    def best_move(self, position, player, budget=None):
+        if not self.in_sync(position, player):
+            self.set_position(position, player)
+        book_move = self.book_move(position, player)
+        if book_move is not None:
+            return book_move
+        self.use_tt_for(player)
+        observed = self.search_stats = self.begin_stats(player)
+        hits = self.tt.hits
+        t0 = time.time()
+        action = self.iterative_deepening(player, player, budget)
+        self.search_stats = None
+        stats = {
+            "depth": self.depth,
+            "score": self.score,
+            "nodes": self.nodes,
+            "time": time.time() - t0,
+            "tt": self.tt.stats(),
+        }
+        if observed is not None:
+            observed.nodes = self.nodes
+            observed.tt_hits = self.tt.hits - hits
+            observed.score = self.score
+            observed.pv = self.principal_variation(player, self.depth)
+            self.end_stats(observed, action)
+        return action, stats
+
+    def use_tt_for(self, player):
+        if self.tt_player != player:
+            self.tt.clear()
+            self.tt_player = player
+
+    # searches the opponent's replies with the engine's side maximizing, so
+    # that the table holds deep results for the position after their move
+    def ponder(self, player, stop):
+        maximize_player = AI if player == PLAYER else PLAYER
+        self.use_tt_for(maximize_player)
+        self.stop = stop
+        try:
+            self.iterative_deepening(maximize_player, player, math.inf)
+        finally:
+            self.stop = threading.Event()
+
+    # searches one ply deeper at a time until the time budget runs out and
+    # returns the best move of the deepest completed search
+    def iterative_deepening(self, maximize_player, player, time_limit=None):
+        if time_limit is None:
+            time_limit = self.time_limit
+        self.nodes = 0
+        self.deadline = None
+        t0 = time.time()
+        best_action = None
+        max_depth = self.max_depth if self.max_depth is not None else self.board.geometry.size
+        for depth in range(1, max_depth + 1):
+            if self.search_stats is not None:
+                self.search_stats.max_depth = depth
+            try:
+                action, score = self.minimax(depth, -math.inf, math.inf, maximize_player, player, best_action)
+            except SearchTimeout:
+                break
+            best_action = action
+            self.depth = depth
+            self.score = score
+            # depth 1 always completes, later depths are cut by the deadline
+            self.deadline = t0 + time_limit
+            if abs(score) == math.inf or time.time() > self.deadline or self.stop.is_set():
+                break
+        return best_action
+
+    def play(self, action, player):
+        self.evaluator.play(self.board.heights[action], player)
+        self.board.play(action, player)
+
+    def undo(self, action, player):
+        self.board.undo(action, player)
+        self.evaluator.undo(self.board.heights[action], player)
+
+    # best actions stored in the table from the current position, at most
+    # depth of them
+    def principal_variation(self, player, depth):
+        board = self.board.copy()
+        pv = []
+        for _ in range(depth):
+            entry = self.tt.probe(board.hash)
+            if entry is None or not 0 <= entry[3] < board.geometry.cols or not board.can_play(entry[3]):
+                break
+            board.play(entry[3], player)
+            pv.append(entry[3])
+            if board.winning_move(player):
+                break
+            player = AI if player == PLAYER else PLAYER
+        return pv
+
+    # returns available actions center first, with first_action (the best
+    # action of the previous iteration) in front
+    def order_actions(self, first_action=None):
+        board = self.board
+        actions = [c for c in board.geometry.center_order if board.can_play(c)]
+        if first_action in actions:
+            actions.remove(first_action)
+            actions.insert(0, first_action)
+        return actions
+
+    def minimax(self, depth, alpha, beta, maximize_player, player, first_action=None):
+        self.nodes += 1
+        if not self.nodes & 1023:
+            if self.search_stats is not None:
+                self.search_stats.nodes = self.nodes
+                self.sample(self.search_stats)
+            if self.deadline is not None and (time.time() > self.deadline or self.stop.is_set()):
+                raise SearchTimeout()
+        board = self.board
         opp = AI if player == PLAYER else PLAYER
-        is_terminal = utils.is_terminal_node(current_state, opp)
-
-        if is_terminal:
-            if utils.winning_move(current_state, player):
-                return (None, math.inf)
-            elif utils.winning_move(current_state, opp):
-                return (None, -math.inf)
-            else:
-                return (None, 0)
+
+        alpha_orig = alpha
+        beta_orig = beta
+        entry = self.tt.probe(board.hash)
+        if entry is not None:
+            tt_depth, tt_flag, tt_score, tt_action = entry
+            if tt_depth >= depth:
+                if tt_flag == TranspositionTable.EXACT:
+                    return (tt_action, tt_score)
+                elif tt_flag == TranspositionTable.LOWER:
+                    alpha = max(alpha, tt_score)
+                else:
+                    beta = min(beta, tt_score)
+                if alpha >= beta:
+                    return (tt_action, tt_score)
+            if first_action is None:
+                first_action = tt_action
+
+        # leaves are scored before any move list is built
+        if board.moves == board.geometry.size:
+            return (None, 0)
         if depth == 0:
-            return (None, utils.eval_board(current_state))
-    
-        if not self.tree[current_node_id]["children"]:
-            utils.generate_children(self, current_node_id, player)
+            return (None, self.evaluator.evaluate(maximize_player))
+        actions = self.order_actions(first_action)
 
         if player == maximize_player:
             best_score = -math.inf
-            child_score = -math.inf
-            best_actions = {}
-            for child_id in self.tree[current_node_id]["children"]:
-                action = self.tree[child_id]["action"]
-                child_state = self.tree[child_id]["state"]
-                if utils.winning_move(child_state, player):
+            best_action = actions[0]
+            for action in actions:
+                self.play(action, player)
+                if board.winning_move(player):
+                    self.undo(action, player)
                     return (action, math.inf)
-                child_score = self.minimax(depth-1, child_id, maximize_player, opp)[1]
+                try:
+                    child_score = self.minimax(depth-1, alpha, beta, maximize_player, opp)[1]
+                finally:
+                    self.undo(action, player)
                 if child_score > best_score:
                     best_score = child_score
-                    best_actions = {action: child_score}
-                elif child_score == best_score:
-                    best_actions[action] = child_score
-            best_action = random.choice(list(best_actions.keys()))
-            return (best_action, best_actions[best_action])
+                    best_action = action
+                alpha = max(alpha, best_score)
+                if alpha >= beta:
+                    break
+            self.store(depth, alpha_orig, beta_orig, best_score, best_action)
+            return (best_action, best_score)
         else:
             best_score = math.inf
-            child_score = math.inf
-            best_actions = {}
-            for child_id in self.tree[current_node_id]["children"]:
-                action = self.tree[child_id]["action"]
-                child_state = self.tree[child_id]["state"]
-                if utils.winning_move(child_state, player):
+            best_action = actions[0]
+            for action in actions:
+                self.play(action, player)
+                if board.winning_move(player):
+                    self.undo(action, player)
                     return (action, -math.inf)
-                child_score = self.minimax(depth-1, child_id, maximize_player, opp)[1]
+                try:
+                    child_score = self.minimax(depth-1, alpha, beta, maximize_player, opp)[1]
+                finally:
+                    self.undo(action, player)
                 if child_score < best_score:
                     best_score = child_score
-                    best_actions = {action: child_score}
-                elif child_score == best_score:
-                    best_actions[action] = child_score
-            best_action = random.choice(list(best_actions.keys()))
-            return (best_action, best_actions[best_action])
\ No newline at end of file
+                    best_action = action
+                beta = min(beta, best_score)
+                if alpha >= beta:
+                    break
+            self.store(depth, alpha_orig, beta_orig, best_score, best_action)
+            return (best_action, best_score)
+
+    # scores are stored from maximize_player's side, which is fixed for a game
+    def store(self, depth, alpha, beta, score, action):
+        if score <= alpha:
+            flag = TranspositionTable.UPPER
+        elif score >= beta:
+            flag = TranspositionTable.LOWER
+        else:
+            flag = TranspositionTable.EXACT
+        self.tt.store(self.board.hash, depth, flag, score, action)
@@ -0,0 +1,101 @@
+from array import array
+
+# index used for "no parent / no child / no sibling"
+NO_NODE = -1
+# untried moves of a node whose legal moves have not been generated yet
+UNEXPANDED = -1
+
+class NodePool:
+
+    # struct-of-arrays node store: node i is the i-th entry of every buffer.
+    # Children of a node form a linked list through first_child/next_sibling,
+    # positions are not stored and are rebuilt by replaying moves from the root.
+    # Children are added one at a time, untried holds the columns (bit c for
+    # column c) of the legal moves that have no child yet
+    def __init__(self, capacity=1024):
+        self.capacity = 0
+        self.size = 0
+        self.visits = array("i")
+        self.wins = array("i")
+        self.parent = array("i")
+        self.first_child = array("i")
+        self.next_sibling = array("i")
+        self.move = array("b")
+        self.player = array("b")
+        self.untried = array("i")
+        self.buffers = (self.visits, self.wins, self.parent, self.first_child, self.next_sibling, self.move, self.player, self.untried)
+        self.grow(capacity)
+
+    # grows every buffer by `extra` zeroed entries
+    def grow(self, extra):
+        for buffer in self.buffers:
+            buffer.frombytes(bytes(buffer.itemsize * extra))
+        self.capacity += extra
+
+    # returns index of a new node, doubling the buffers when they are full
+    def new_node(self, parent, move, player):
+        if self.size == self.capacity:
+            self.grow(self.capacity)
+        node = self.size
+        self.size += 1
+        self.visits[node] = 0
+        self.wins[node] = 0
+        self.parent[node] = parent
+        self.first_child[node] = NO_NODE
+        self.next_sibling[node] = NO_NODE
+        self.move[node] = move
+        self.player[node] = player
+        self.untried[node] = UNEXPANDED
+        return node
+
+    def add_child(self, parent, move, player):
+        child = self.new_node(parent, move, player)
+        self.next_sibling[child] = self.first_child[parent]
+        self.first_child[parent] = child
+        return child
+
+    def children(self, node):
+        child = self.first_child[node]
+        next_sibling = self.next_sibling
+        while child != NO_NODE:
+            yield child
+            child = next_sibling[child]
+
+    # returns the child of node reached by playing move, or NO_NODE
+    def find_child(self, node, move):
+        for child in self.children(node):
+            if self.move[child] == move:
+                return child
+        return NO_NODE
+
+    def bytes_per_node(self):
+        return sum(buffer.itemsize for buffer in self.buffers)
+
+    def memory_usage(self):
+        return self.bytes_per_node() * self.capacity
+
+    # returns a new pool holding only the subtree under node, which becomes
+    # its root (index 0) with all statistics kept; the rest is dropped with
+    # the old buffers
+    def subtree(self, node):
+        order = [node]
+        i = 0
+        while i < len(order):
+            order.extend(self.children(order[i]))
+            i += 1
+        new_index = {old: new for new, old in enumerate(order)}
+        new_pool = NodePool(max(1024, 2 * len(order)))
+        new_pool.size = len(order)
+        for new, old in enumerate(order):
+            new_pool.visits[new] = self.visits[old]
+            new_pool.wins[new] = self.wins[old]
+            new_pool.parent[new] = new_index.get(self.parent[old], NO_NODE)
+            new_pool.first_child[new] = new_index.get(self.first_child[old], NO_NODE)
+            new_pool.next_sibling[new] = new_index.get(self.next_sibling[old], NO_NODE)
+            new_pool.move[new] = self.move[old]
+            new_pool.player[new] = self.player[old]
+            new_pool.untried[new] = self.untried[old]
+        # the old root's siblings are not part of the new tree
+        new_pool.parent[0] = NO_NODE
+        new_pool.next_sibling[0] = NO_NODE
+        return new_pool
@@ -0,0 +1,134 @@
+import argparse
+import math
+import mmap
+import multiprocessing as mp
+import os
+import struct
+import time
+import Bitboard
+import MiniMax
+import Rules
+from Rules import PLAYER, AI
+
+MAGIC = b"C4BK"
+HEADER = struct.Struct("<4sI") # magic, number of records
+# canonical key, best move in the canonical orientation, score from the
+# mover's side clamped to int8 (+-127 for a forced win/loss)
+RECORD = struct.Struct("<QBb")
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.bin")
+
+class OpeningBook:
+
+    # sorted records memory-mapped from path, looked up by binary search so
+    # that only the pages touched are read from disk
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or len(self.data) != HEADER.size + self.size * RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is not an opening book")
+
+    # the default book if it was built, else None
+    @classmethod
+    def load_default(cls):
+        if os.path.exists(DEFAULT_PATH):
+            return cls(DEFAULT_PATH)
+        return None
+
+    def record(self, index):
+        return RECORD.unpack_from(self.data, HEADER.size + index * RECORD.size)
+
+    # returns (move, score) for position with player to move, or None; books
+    # only hold positions of the standard board
+    def lookup(self, position, player):
+        if position.geometry is not Rules.STANDARD:
+            return None
+        key, mirrored = position.canonical_key(player)
+        low = 0
+        high = self.size
+        while low < high:
+            middle = (low + high) // 2
+            record_key, move, score = self.record(middle)
+            if record_key < key:
+                low = middle + 1
+            elif record_key > key:
+                high = middle
+            else:
+                return (Rules.STANDARD.cols - 1 - move if mirrored else move), score
+        return None
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+# every position reachable in at most plies moves, one per canonical key,
+# as (key, mirrored, moves) with PLAYER moving first
+def enumerate_positions(plies):
+    positions = {}
+    position = Bitboard.Bitboard()
+    moves = []
+
+    def visit(player):
+        key, mirrored = position.canonical_key(player)
+        if key in positions:
+            return
+        positions[key] = (mirrored, list(moves))
+        if len(moves) == plies:
+            return
+        opp = AI if player == PLAYER else PLAYER
+        for action in position.get_available_actions():
+            position.play(action, player)
+            moves.append(action)
+            if not position.winning_move(player):
+                visit(opp)
+            moves.pop()
+            position.undo(action, player)
+
+    visit(PLAYER)
+    return [(key, mirrored, moves) for key, (mirrored, moves) in positions.items()]
+
+def clamp_score(score):
+    if score == math.inf:
+        return 127
+    if score == -math.inf:
+        return -127
+    return max(-126, min(126, int(round(score))))
+
+# searches one book position, runs in a worker process
+def search_position(args):
+    key, mirrored, moves, time_limit = args
+    position, player = Bitboard.Bitboard.from_moves(moves)
+    engine = MiniMax.MiniMax(time_limit=time_limit, tt_size=1 << 16)
+    move, stats = engine.best_move(position, player)
+    if mirrored:
+        move = Rules.STANDARD.cols - 1 - move
+    return key, move, clamp_score(stats["score"])
+
+# searches every position up to plies moves for time_limit seconds each and
+# writes the sorted book to path
+def build(path, plies, time_limit, workers=None):
+    tasks = [(key, mirrored, moves, time_limit) for key, mirrored, moves in enumerate_positions(plies)]
+    with mp.Pool(workers or mp.cpu_count()) as executor:
+        records = sorted(executor.imap_unordered(search_position, tasks, chunksize=4))
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(records)))
+        for record in records:
+            f.write(RECORD.pack(*record))
+    return len(records)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the opening book offline")
+    parser.add_argument("--plies", type=int, default=4, help="book depth in moves from the empty board")
+    parser.add_argument("--time", type=float, default=1.0, help="search time per position")
+    parser.add_argument("--workers", type=int, default=mp.cpu_count())
+    parser.add_argument("--output", default=DEFAULT_PATH)
+    args = parser.parse_args()
+    t0 = time.time()
+    count = build(args.output, args.plies, args.time, args.workers)
+    print(f"{count} positions written to {args.output} in {time.time() - t0:.1f}s")
@@ -0,0 +1,141 @@
+import argparse
+import multiprocessing as mp
+import random
+import time
+import MCTS
+import utils
+from Rules import PLAYER, AI
+
+# search modes
+ROOT = "root" # independent trees per worker, root statistics merged
+LEAF = "leaf" # one tree, rollouts of a batch of leaves run by the workers
+
+# each pending rollout counts as one lost playout on every node of its path
+# so that the next selections of the same batch spread over other leaves
+VIRTUAL_LOSS_VISITS = 1
+VIRTUAL_LOSS_WINS = -10
+
+# searches a fresh tree from board for time_limit seconds in a worker and
+# returns the (visits, wins) of every root move and the number of playouts
+def root_worker(args):
+    board, player, time_limit, balance_factor, rollout_policy, seed = args
+    random.seed(seed)
+    mcts = MCTS.MCTS(time_limit, balance_factor=balance_factor, rollout_policy=rollout_policy)
+    mcts.set_position(board, player)
+    playouts = mcts.search(mcts.root_node_id)
+    pool = mcts.pool
+    results = {pool.move[child_id]: (pool.visits[child_id], pool.wins[child_id]) for child_id in pool.children(mcts.root_node_id)}
+    return results, playouts
+
+def leaf_worker(args):
+    state, opp, rollout_policy, seed = args
+    random.seed(seed)
+    return MCTS.ROLLOUTS[rollout_policy](state, opp)
+
+class ParallelMCTS(MCTS.MCTS):
+
+    def __init__(self, time_limit=5, workers=None, mode=ROOT, batch_size=None, book=None, balance_factor=MCTS.BALANCE_FACTOR, rollout_policy="light"):
+        self.workers = workers or mp.cpu_count()
+        self.mode = mode
+        # leaves selected per round in leaf mode
+        self.batch_size = batch_size or 8 * self.workers
+        self.executor = None
+        super().__init__(time_limit, book=book, balance_factor=balance_factor, rollout_policy=rollout_policy)
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = mp.Pool(self.workers)
+        return self.executor
+
+    def close(self):
+        super().close()
+        if self.executor is not None:
+            self.executor.terminate()
+            self.executor = None
+
+    # playouts run in the workers, so stats gets no phase times
+    def search(self, current_node_id, time_limit=None, stats=None):
+        if time_limit is None:
+            time_limit = self.time_limit
+        if self.mode == ROOT:
+            return self.search_root(current_node_id, time_limit)
+        return self.search_leaf(current_node_id, time_limit)
+
+    # the workers' root statistics are added to the children of
+    # current_node_id in the engine's own tree, so that best_action, the
+    # stats and the principal variation read them like any other search,
+    # and the counts gathered by pondering or kept from earlier moves in
+    # that tree add to them
+    def search_root(self, current_node_id, time_limit):
+        pool = self.pool
+        player = AI if pool.player[current_node_id] == PLAYER else PLAYER
+        tasks = [(self.board, player, time_limit, self.balance_factor, self.rollout_policy, random.getrandbits(64)) for _ in range(self.workers)]
+        utils.generate_children(pool, current_node_id, self.board, player)
+        children = {pool.move[child_id]: child_id for child_id in pool.children(current_node_id)}
+        playouts = 0
+        for results, worker_playouts in self.get_executor().map(root_worker, tasks):
+            for action, (visits, wins) in results.items():
+                pool.visits[children[action]] += visits
+                pool.wins[children[action]] += wins
+            pool.visits[current_node_id] += worker_playouts
+            playouts += worker_playouts
+        self.total_visits += playouts
+        return playouts
+
+    def search_leaf(self, current_node_id, time_limit):
+        executor = self.get_executor()
+        pool = self.pool
+        playouts = 0
+        t0 = time.time()
+        while time.time() - t0 < time_limit:
+            paths = []
+            tasks = []
+            for _ in range(self.batch_size):
+                path, state = self.selection(current_node_id)
+                expanded_node = self.expansion(path[-1], state)
+                if expanded_node != path[-1]:
+                    path.append(expanded_node)
+                self.add_virtual_loss(path, VIRTUAL_LOSS_VISITS, VIRTUAL_LOSS_WINS)
+                paths.append(path)
+                tasks.append((state, pool.player[expanded_node], self.rollout_policy, random.getrandbits(64)))
+            winners = executor.map(leaf_worker, tasks, chunksize=max(1, len(tasks) // self.workers))
+            for path, winner in zip(paths, winners):
+                self.add_virtual_loss(path, -VIRTUAL_LOSS_VISITS, -VIRTUAL_LOSS_WINS)
+                self.total_visits += 1
+                self.backpropagation(path, winner)
+            playouts += len(paths)
+        return playouts
+
+    def add_virtual_loss(self, path, visits, wins):
+        pool = self.pool
+        for node_id in path:
+            pool.visits[node_id] += visits
+            pool.wins[node_id] += wins
+
+# playouts per second from the empty board with 1 to max_workers workers
+def scaling_report(max_workers, mode=ROOT, time_limit=2, rollout_policy="light"):
+    results = []
+    for workers in range(1, max_workers + 1):
+        mcts = ParallelMCTS(time_limit, workers=workers, mode=mode, rollout_policy=rollout_policy)
+        try:
+            mcts.get_executor() # process start-up is not part of the measurement
+            t0 = time.time()
+            playouts = mcts.search(mcts.root_node_id)
+            elapsed = time.time() - t0
+        finally:
+            mcts.close()
+        results.append((workers, playouts / elapsed))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel MCTS scaling report")
+    parser.add_argument("--workers", type=int, default=mp.cpu_count())
+    parser.add_argument("--mode", choices=[ROOT, LEAF], default=ROOT)
+    parser.add_argument("--time", type=float, default=2)
+    parser.add_argument("--policy", choices=list(MCTS.ROLLOUTS), default="light", help="playout policy")
+    args = parser.parse_args()
+    results = scaling_report(args.workers, args.mode, args.time, args.policy)
+    base = results[0][1]
+    print(f"{'workers':>7} {'playouts/s':>12} {'speedup':>8}")
+    for workers, rate in results:
+        print(f"{workers:>7} {rate:>12.0f} {rate / base:>8.2f}")
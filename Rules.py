@@ -0,0 +1,142 @@
+import functools
+import random
+
+# players
+EMPTY = 0
+PLAYER = 1
+AI = 2
+
+# pieces in a row needed to win
+CONNECT = 4
+
+class Geometry:
+
+    # every table derived from the board size. Build it with geometry(), which
+    # caches one instance per size, so that Bitboards, evaluators and engines
+    # of the same variant share their tables and switching variants costs
+    # nothing at move time.
+    #
+    # Bitboards use HEIGHT = rows + 1 bits per column (rows cells plus one
+    # sentinel bit on top) so that shifts never carry a line from one column
+    # into the next. Bit indices hold in Python ints for any size, but only
+    # boards with fits_uint64 work with the numpy batch paths (BatchRollout,
+    # Evaluator.evaluate_batch) and the 64-bit keyed tables (Solver).
+    def __init__(self, rows, cols):
+        if rows < CONNECT or cols < CONNECT:
+            raise ValueError(f"a {cols}x{rows} board is too small for {CONNECT} in a row")
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        self.height = rows + 1
+        self.bits = cols * self.height
+        self.fits_uint64 = self.bits <= 64
+        height = self.height
+
+        # bit index of the bottom cell of every column, and all playable cells
+        self.bottom_mask = sum(1 << (c * height) for c in range(cols))
+        self.board_mask = self.bottom_mask * ((1 << rows) - 1)
+        self.column_mask = (1 << height) - 1
+        # playable cells of every column
+        self.column_masks = [((1 << rows) - 1) << (c * height) for c in range(cols)]
+        self.center_mask = self.column_masks[cols // 2]
+        # height limit (index of the sentinel bit) of every column
+        self.column_limits = [c * height + rows for c in range(cols)]
+        # vertical, horizontal and both diagonal directions
+        self.directions = (1, height, height - 1, height + 1)
+        # every four-cell line on the board as a bitmask (69 on a 7x6 board)
+        self.windows = self._windows()
+        # columns from the center outwards, used to order moves
+        self.center_order = sorted(range(cols), key=lambda c: abs(c - cols // 2))
+
+        # random 64-bit key per (player, bit), xor-ed together into Bitboard.hash
+        rng = random.Random(0xC4)
+        self.zobrist = [[rng.getrandbits(64) for _ in range(self.bits)] for _ in range(3)]
+
+    def __repr__(self):
+        return f"Geometry({self.rows}, {self.cols})"
+
+    # pickles as its size and unpickles as the shared instance of geometry(),
+    # so that boards sent to worker processes neither carry the tables nor
+    # miss the caches keyed on the geometry
+    def __reduce__(self):
+        return (geometry, (self.rows, self.cols))
+
+    # "COLSxROWS", the usual way to name a variant (7x6 is the standard board)
+    @property
+    def name(self):
+        return f"{self.cols}x{self.rows}"
+
+    # returns bit index of cell (row, col), row 0 being the top row like Gameboard.state
+    def cell_bit(self, row, col):
+        return col * self.height + (self.rows - 1 - row)
+
+    def _windows(self):
+        windows = []
+        for r in range(self.rows):
+            for c in range(self.cols):
+                for dr, dc in ((0, 1), (1, 0), (1, 1), (-1, 1)):
+                    cells = [(r + i * dr, c + i * dc) for i in range(CONNECT)]
+                    if all(0 <= row < self.rows and 0 <= col < self.cols for row, col in cells):
+                        windows.append(sum(1 << self.cell_bit(row, col) for row, col in cells))
+        return windows
+
+    # bitboard b with its columns in reverse order (horizontal mirror)
+    def mirror_bits(self, b):
+        mirrored = 0
+        height = self.height
+        column_mask = self.column_mask
+        last = self.cols - 1
+        for c in range(self.cols):
+            mirrored |= ((b >> (c * height)) & column_mask) << ((last - c) * height)
+        return mirrored
+
+    # true if bitboard b contains four aligned bits
+    def has_four(self, b):
+        for shift in self.directions:
+            m = b & (b >> shift)
+            if m & (m >> (2 * shift)):
+                return True
+        return False
+
+    # empty cells (not necessarily playable yet) that would complete a four for
+    # the player owning bitboard b, mask being all occupied cells
+    def winning_cells(self, b, mask):
+        h = self.height
+        # vertical
+        cells = (b << 1) & (b << 2) & (b << 3)
+        # horizontal, then both diagonals (unrolled, this is the solver's hot spot)
+        pair = (b << h) & (b << 2 * h)
+        cells |= pair & ((b << 3 * h) | (b >> h))
+        pair = (b >> h) & (b >> 2 * h)
+        cells |= pair & ((b << h) | (b >> 3 * h))
+        d = h - 1
+        pair = (b << d) & (b << 2 * d)
+        cells |= pair & ((b << 3 * d) | (b >> d))
+        pair = (b >> d) & (b >> 2 * d)
+        cells |= pair & ((b << d) | (b >> 3 * d))
+        d = h + 1
+        pair = (b << d) & (b << 2 * d)
+        cells |= pair & ((b << 3 * d) | (b >> d))
+        pair = (b >> d) & (b >> 2 * d)
+        cells |= pair & ((b << d) | (b >> 3 * d))
+        return cells & (self.board_mask ^ mask)
+
+# the geometry of a rows x cols board, built once per size; the cache is
+# keyed on the size alone, however the arguments are passed, so that every
+# board of a size gets the same instance
+def geometry(rows=6, cols=7):
+    return cached_geometry(rows, cols)
+
+@functools.lru_cache(maxsize=None)
+def cached_geometry(rows, cols, /):
+    return Geometry(rows, cols)
+
+STANDARD = geometry(6, 7)
+
+# geometry of a "COLSxROWS" variant name such as "7x6" or "9x7", raises ValueError
+def parse(name):
+    try:
+        cols, rows = (int(part) for part in name.lower().split("x"))
+    except ValueError:
+        raise ValueError(f"board size {name!r} is not COLSxROWS") from None
+    return geometry(rows, cols)
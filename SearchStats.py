@@ -0,0 +1,84 @@
+import json
+import sys
+import time
+
+# MCTS phases timed while an observer is attached
+PHASES = ("selection", "expansion", "simulation", "backpropagation")
+
+class SearchStats:
+
+    # counters of one move search, only collected while the engine has
+    # observers; fields an engine does not track stay at 0 / empty
+    __slots__ = ("engine", "player", "move", "score", "nodes", "playouts", "tt_hits", "max_depth", "pv", "phase_times", "start", "time", "next_sample")
+
+    def __init__(self, engine, player):
+        self.engine = engine
+        self.player = player
+        self.move = None
+        self.score = None
+        self.nodes = 0
+        self.playouts = 0
+        self.tt_hits = 0
+        self.max_depth = 0
+        # principal variation, best move first
+        self.pv = []
+        self.phase_times = dict.fromkeys(PHASES, 0.0)
+        self.start = time.perf_counter()
+        self.time = 0.0
+        self.next_sample = None
+
+    def to_dict(self):
+        return {
+            "engine": self.engine,
+            "player": self.player,
+            "move": self.move,
+            "score": self.score,
+            "nodes": self.nodes,
+            "playouts": self.playouts,
+            "tt_hits": self.tt_hits,
+            "max_depth": self.max_depth,
+            "pv": list(self.pv),
+            "phase_times": dict(self.phase_times),
+            "time": self.time,
+        }
+
+class Observer:
+
+    # receives the stats of every move searched by the engines it is added to
+    # (Engine.add_observer); on_sample is also called about every
+    # sample_interval seconds during a search, never if it is 0
+    def __init__(self, sample_interval=0):
+        self.sample_interval = sample_interval
+
+    # stats of a search in progress, stats.time being the time spent so far
+    def on_sample(self, stats):
+        pass
+
+    def on_move(self, stats):
+        pass
+
+class JsonLinesLog(Observer):
+
+    # appends one JSON object per move (and per sample) to a file, ready to
+    # be aggregated like the server's logs
+    def __init__(self, path=None, sample_interval=0):
+        super().__init__(sample_interval)
+        self.file = open(path, "a") if path else sys.stdout
+        self.owned = path is not None
+
+    def write(self, event, stats):
+        record = stats.to_dict()
+        record["event"] = event
+        record["timestamp"] = time.time()
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def on_sample(self, stats):
+        self.write("sample", stats)
+
+    def on_move(self, stats):
+        self.write("move", stats)
+
+    def close(self):
+        if self.owned:
+            self.file.close()
@@ -0,0 +1,275 @@
+import argparse
+import math
+import threading
+import time
+import Bitboard
+import Engine
+import MiniMax
+import Rules
+import TranspositionTable
+from Rules import PLAYER
+
+# share of the budget spent solving before falling back to the heuristic search
+SOLVE_SHARE = 0.75
+
+# cells of the columns that can be played, one bit per column
+def possible(geometry, mask):
+    return (mask + geometry.bottom_mask) & geometry.board_mask
+
+# true if the side to move (holding current) wins with its next piece
+def can_win_next(geometry, current, mask):
+    return bool(geometry.winning_cells(current, mask) & possible(geometry, mask))
+
+# playable cells that do not lose at once: a forced block if the opponent
+# threatens to win, none if they threaten twice, and never the cell below
+# one of their winning cells
+def non_losing_moves(geometry, current, mask):
+    moves = possible(geometry, mask)
+    opp_wins = geometry.winning_cells(current ^ mask, mask)
+    forced = moves & opp_wins
+    if forced:
+        if forced & (forced - 1):
+            return 0
+        moves = forced
+    return moves & ~(opp_wins >> 1)
+
+# table key of the position, the same for a position and its mirror image
+def canonical_key(geometry, current, mask):
+    key = current + mask + geometry.bottom_mask
+    return min(key, geometry.mirror_bits(key))
+
+class Solver(Engine.Engine):
+
+    # exact negamax search: positions are (current, mask) pairs from the side
+    # to move, so the table stays valid for both players and the whole game;
+    # table keys need boards that fit in 64 bits
+    def __init__(self, time_limit=2, tt_size=1 << 20, book=None):
+        super().__init__(book)
+        self.time_limit = time_limit
+        self.score = 0 # exact score of the last move, None if not solved
+        self.nodes = 0
+        self.deadline = None
+        # set to abort the search early (pondering)
+        self.stop = threading.Event()
+        # SearchStats of the move being searched while observed
+        self.search_stats = None
+        self.tt = TranspositionTable.TranspositionTable(tt_size)
+        self.board = None
+        # heuristic search used when a position cannot be solved in time
+        self.fallback = MiniMax.MiniMax(time_limit, tt_size=max(1, tt_size >> 4))
+        self.set_position(Bitboard.Bitboard(), PLAYER)
+
+    def set_position(self, position, player):
+        if not position.geometry.fits_uint64:
+            raise ValueError(f"cannot solve {position.geometry.name} boards, they do not fit in 64 bits")
+        if self.board is not None and position.geometry is not self.board.geometry:
+            self.tt.clear()
+        self.board = position.copy()
+        self.geometry = position.geometry
+        self.fallback.set_position(position, player)
+
+    def play(self, move, player):
+        self.board.play(move, player)
+        self.fallback.play(move, player)
+
+    def best_move(self, position, player, budget=None):
+        if not self.in_sync(position, player):
+            self.set_position(position, player)
+        book_move = self.book_move(position, player)
+        if book_move is not None:
+            return book_move
+        if budget is None:
+            budget = self.time_limit
+        observed = self.search_stats = self.begin_stats(player)
+        hits = self.tt.hits
+        t0 = time.time()
+        self.nodes = 0
+        self.deadline = t0 + budget * SOLVE_SHARE
+        try:
+            move, score = self.solve_move(self.board.boards[player], self.board.mask, self.board.moves)
+        except MiniMax.SearchTimeout:
+            move = None
+        finally:
+            self.search_stats = None
+        elapsed = time.time() - t0
+        stats = {
+            "solved": move is not None,
+            "nodes": self.nodes,
+            "nps": self.nodes / elapsed if elapsed > 0 else 0.0,
+            "time": elapsed,
+            "tt": self.tt.stats(),
+        }
+        if move is None:
+            move, fallback_stats = self.fallback.best_move(position, player, max(0.0, budget - elapsed))
+            score = None
+            stats["fallback"] = fallback_stats
+            stats["time"] = time.time() - t0
+        self.score = score
+        stats["score"] = score
+        if observed is not None:
+            observed.nodes = self.nodes
+            observed.tt_hits = self.tt.hits - hits
+            observed.score = score
+            self.end_stats(observed, move)
+        return move, stats
+
+    # fills the table with the position the opponent is thinking about
+    def ponder(self, player, stop):
+        self.stop = stop
+        self.deadline = math.inf
+        try:
+            self.solve(self.board.boards[player], self.board.mask, self.board.moves)
+        except MiniMax.SearchTimeout:
+            pass
+        finally:
+            self.stop = threading.Event()
+
+    # returns (move, score) of the best move for the side to move
+    def solve_move(self, current, mask, moves):
+        geometry = self.geometry
+        wins = geometry.winning_cells(current, mask) & possible(geometry, mask)
+        if wins:
+            return self.column_of(wins & -wins), (geometry.size + 1 - moves) // 2
+        score = self.solve(current, mask, moves)
+        candidates = non_losing_moves(geometry, current, mask)
+        if not candidates:
+            # every move loses at once
+            moves_left = possible(geometry, mask)
+            return self.column_of(moves_left & -moves_left), score
+        # any move whose reply scores at most -score reaches score
+        for col in geometry.center_order:
+            move = candidates & geometry.column_masks[col]
+            if not move:
+                continue
+            if moves + 1 == geometry.size:
+                return col, 0
+            reply = self.negamax(current ^ mask, mask | move, moves + 1, -score, -score + 1)
+            if -reply >= score:
+                return col, score
+        raise AssertionError("no move reaches the solved score")
+
+    def column_of(self, move):
+        return (move.bit_length() - 1) // self.geometry.height
+
+    # exact score of the position by null-window searches that narrow the
+    # score interval, probing near 0 first where most positions are decided.
+    # Scores are from the side to move: winning with k own pieces left to
+    # play scores k + 1 (the earlier the win the higher), a loss the
+    # opposite, a draw 0
+    def solve(self, current, mask, moves):
+        size = self.geometry.size
+        if can_win_next(self.geometry, current, mask):
+            return (size + 1 - moves) // 2
+        low = -((size - moves) // 2)
+        high = (size + 1 - moves) // 2
+        while low < high:
+            middle = low + (high - low) // 2
+            if middle <= 0 and int(low / 2) < middle:
+                middle = int(low / 2)
+            elif middle >= 0 and int(high / 2) > middle:
+                middle = int(high / 2)
+            score = self.negamax(current, mask, moves, middle, middle + 1)
+            if score <= middle:
+                high = score
+            else:
+                low = score
+        return low
+
+    # score of the position within (alpha, beta), assuming the side to move
+    # cannot win with its next piece
+    def negamax(self, current, mask, moves, alpha, beta):
+        self.nodes += 1
+        if not self.nodes & 1023:
+            if self.search_stats is not None:
+                self.search_stats.nodes = self.nodes
+                self.sample(self.search_stats)
+            if time.time() > self.deadline or self.stop.is_set():
+                raise MiniMax.SearchTimeout()
+
+        geometry = self.geometry
+        size = geometry.size
+        candidates = non_losing_moves(geometry, current, mask)
+        if not candidates:
+            return -((size - moves) // 2)
+        if moves >= size - 2:
+            return 0
+
+        low = -((size - 2 - moves) // 2)
+        if alpha < low:
+            alpha = low
+            if alpha >= beta:
+                return alpha
+        high = (size - 1 - moves) // 2
+
+        key = canonical_key(geometry, current, mask)
+        entry = self.tt.probe(key)
+        if entry is not None:
+            flag = entry[1]
+            tt_score = int(entry[2])
+            if flag == TranspositionTable.UPPER:
+                high = min(high, tt_score)
+            elif flag == TranspositionTable.LOWER:
+                if alpha < tt_score:
+                    alpha = tt_score
+            else:
+                return tt_score
+            if alpha >= beta:
+                return alpha
+        if beta > high:
+            beta = high
+            if alpha >= beta:
+                return beta
+
+        # moves creating the most threats first, center first among equals
+        if candidates & (candidates - 1):
+            ordered = []
+            column_masks = geometry.column_masks
+            for col in geometry.center_order:
+                move = candidates & column_masks[col]
+                if move:
+                    threats = geometry.winning_cells(current | move, mask).bit_count()
+                    ordered.append((-threats, len(ordered), move))
+            ordered.sort()
+        else:
+            ordered = [(0, 0, candidates)]
+
+        for _, _, move in ordered:
+            score = -self.negamax(current ^ mask, mask | move, moves + 1, -beta, -alpha)
+            if score >= beta:
+                self.tt.store(key, size - moves, TranspositionTable.LOWER, score, -1)
+                return score
+            if score > alpha:
+                alpha = score
+        self.tt.store(key, size - moves, TranspositionTable.UPPER, alpha, -1)
+        return alpha
+
+# replays moves (columns, PLAYER first) and solves the resulting position
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve a Connect 4 position exactly")
+    parser.add_argument("moves", help="columns played from the empty board, e.g. 3342")
+    parser.add_argument("--time", type=float, default=60.0, help="time limit")
+    parser.add_argument("--board", default="7x6", help="board size as COLSxROWS")
+    args = parser.parse_args()
+    try:
+        geometry = Rules.parse(args.board)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        position, player = Bitboard.Bitboard.from_moves(args.moves, PLAYER, geometry)
+    except ValueError as e:
+        parser.error(str(e))
+    if position.is_over():
+        parser.error("game is already over")
+    solver = Solver()
+    try:
+        solver.set_position(position, player)
+    except ValueError as e:
+        parser.error(str(e))
+    t0 = time.time()
+    solver.deadline = t0 + args.time
+    try:
+        move, score = solver.solve_move(position.boards[player], position.mask, position.moves)
+    except MiniMax.SearchTimeout:
+        parser.exit(1, f"not solved within {args.time}s ({solver.nodes} nodes)\n")
+    elapsed = time.time() - t0
+    print(f"move {move} score {score} nodes {solver.nodes} ({solver.nodes / elapsed:.0f} nodes/s) in {elapsed:.2f}s")
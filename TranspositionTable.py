@@ -0,0 +1,80 @@
+from array import array
+
+# bound types of a stored score
+EXACT = 0
+LOWER = 1 # score is a lower bound (search failed high)
+UPPER = 2 # score is an upper bound (search failed low)
+
+class TranspositionTable:
+
+    # size is the number of entries, split into buckets of two: the first slot
+    # of a bucket keeps the deepest search seen, the second always takes the
+    # latest store that did not fit the first
+    def __init__(self, size=1 << 20):
+        self.num_buckets = max(1, size // 2)
+        self.size = self.num_buckets * 2
+        self.keys = array("Q", bytes(8 * self.size))
+        self.depths = array("b", [-1]) * self.size # -1 marks an empty slot
+        self.flags = array("b", bytes(self.size))
+        self.scores = array("d", bytes(8 * self.size))
+        self.actions = array("b", bytes(self.size))
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    # returns (depth, flag, score, action) stored for key, or None
+    def probe(self, key):
+        i = (key % self.num_buckets) * 2
+        keys = self.keys
+        depths = self.depths
+        for slot in (i, i + 1):
+            if depths[slot] >= 0:
+                if keys[slot] == key:
+                    self.hits += 1
+                    return (depths[slot], self.flags[slot], self.scores[slot], self.actions[slot])
+                self.collisions += 1
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, flag, score, action):
+        i = (key % self.num_buckets) * 2
+        depths = self.depths
+        # depth-preferred slot: take it if it is empty, holds the same
+        # position or a shallower search, otherwise use the always-replace slot
+        if depths[i] < 0 or self.keys[i] == key or depth >= depths[i]:
+            slot = i
+        else:
+            slot = i + 1
+        if depths[slot] >= 0 and self.keys[slot] != key:
+            self.overwrites += 1
+        self.keys[slot] = key
+        depths[slot] = depth
+        self.flags[slot] = flag
+        self.scores[slot] = score
+        self.actions[slot] = action
+        self.stores += 1
+
+    def clear(self):
+        self.depths = array("b", [-1]) * self.size
+
+    def filled(self):
+        return self.size - self.depths.count(-1)
+
+    def memory_usage(self):
+        return sum(buffer.itemsize * len(buffer) for buffer in (self.keys, self.depths, self.flags, self.scores, self.actions))
+
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            "size": self.size,
+            "filled": self.filled(),
+            "bytes": self.memory_usage(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / probes if probes else 0.0,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+        }
@@ -0,0 +1,202 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import timeit
+import Bitboard
+import MCTS
+import MiniMax
+import Rules
+import utils
+from Rules import PLAYER
+
+# fixed positions as columns played from the empty board (PLAYER first),
+# none of them over or with a win in one for the side to move on the
+# standard board; they can be replayed on any board at least as large
+CORPUS = {
+    "opening": ["3154", "2153", "6562"],
+    "middlegame": ["41565323454124", "3566514163062533", "311051606264264653"],
+    "endgame": ["6560454355500104161540411341", "242350336224411666213634231560", "46615011541012413304636625552350"],
+}
+
+# returns (position, player to move) after moves
+def position(moves, geometry=Rules.STANDARD):
+    return Bitboard.Bitboard.from_moves(moves, PLAYER, geometry)
+
+def corpus_positions(geometry=Rules.STANDARD):
+    return [position(moves, geometry) for phase in CORPUS.values() for moves in phase]
+
+# peak resident set size of the process so far
+def peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+# best time per call in nanoseconds of fn over every corpus position
+def time_calls(fn, positions, repeat):
+    def run():
+        for board, player in positions:
+            fn(board, player)
+    number = max(1, 20000 // len(positions))
+    best = min(timeit.repeat(run, number=number, repeat=repeat))
+    return best / (number * len(positions)) * 1e9
+
+def micro_benchmarks(repeat=5, geometry=Rules.STANDARD):
+    positions = corpus_positions(geometry)
+    functions = {
+        "winning_move": lambda board, player: utils.winning_move(board, player),
+        "drop_piece": lambda board, player: utils.drop_piece(board, 3 if board.can_play(3) else board.get_available_actions()[0], player),
+        "get_available_actions": lambda board, player: utils.get_available_actions(board),
+        "eval_board": lambda board, player: utils.eval_board(board, player),
+    }
+    return {name: {"ns_per_call": time_calls(fn, positions, repeat)} for name, fn in functions.items()}
+
+# runs one move search per corpus position with a fresh engine and sums the
+# work counters, rate being counter / search time; the slowest move shows
+# how far the engine overshoots its budget, and engines reporting their tree
+# memory (MCTS) add their node size and largest tree
+def macro_run(make_engine, counter, budget, geometry=Rules.STANDARD):
+    results = {}
+    for phase, games in CORPUS.items():
+        work = 0
+        elapsed = 0.0
+        slowest = 0.0
+        memory = None
+        for moves in games:
+            board, player = position(moves, geometry)
+            engine = make_engine()
+            engine.set_position(board, player)
+            t0 = time.perf_counter()
+            _, stats = engine.best_move(board, player, budget)
+            latency = time.perf_counter() - t0
+            elapsed += latency
+            slowest = max(slowest, latency)
+            work += stats[counter]
+            if "memory_bytes" in stats:
+                memory = max(memory or 0, stats["memory_bytes"])
+                results["bytes_per_node"] = stats["bytes_per_node"]
+            engine.close()
+        results[phase] = {counter: work, "seconds": elapsed, "max_move_seconds": slowest, f"{counter}_per_second": work / elapsed}
+        if memory is not None:
+            results[phase]["max_memory_bytes"] = memory
+    results["peak_rss_kb"] = peak_rss_kb()
+    return results
+
+# engines of the macro benchmarks: (engine class, keyword arguments, work counter)
+MACRO_ENGINES = {
+    "mcts": (MCTS.MCTS, {}, "playouts"),
+    "mcts_heavy": (MCTS.MCTS, {"rollout_policy": "heavy"}, "playouts"),
+    "minimax": (MiniMax.MiniMax, {}, "nodes"),
+}
+
+def macro_engine(name, budget, geometry=Rules.STANDARD):
+    engine_class, kwargs, counter = MACRO_ENGINES[name]
+    return macro_run(lambda: engine_class(**kwargs), counter, budget, geometry)
+
+# every engine runs in a fresh interpreter, so that its peak_rss_kb is its
+# own and not the highest of everything that ran before it in the process
+def macro_benchmarks(budget, geometry=Rules.STANDARD):
+    results = {}
+    for name in MACRO_ENGINES:
+        with mp.get_context("spawn").Pool(1) as executor:
+            results[name] = executor.apply(macro_engine, (name, budget, geometry))
+    return results
+
+# modules whose cold import is timed, the interactive and analysis entry
+# point first
+IMPORTS = ["connect4", "Bitboard", "MiniMax", "MCTS", "Solver", "Gameboard"]
+
+# best wall time in milliseconds of a fresh interpreter importing each module
+# (its cold start), less that of an interpreter importing nothing
+def import_benchmarks(repeat=5, modules=IMPORTS):
+    directory = os.path.dirname(os.path.abspath(__file__))
+    def cold_start(code):
+        best = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], cwd=directory, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        return best * 1e3
+    interpreter = cold_start("pass")
+    results = {name: {"import_ms": cold_start(f"import {name}") - interpreter} for name in modules}
+    results["interpreter_ms"] = interpreter
+    return results
+
+def run(budget=1.0, repeat=5, micro=True, macro=True, geometry=Rules.STANDARD, imports=True):
+    random.seed(0)
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "board": geometry.name,
+        "budget": budget,
+    }
+    if imports:
+        report["imports"] = import_benchmarks(repeat)
+    if micro:
+        report["micro"] = micro_benchmarks(repeat, geometry)
+    if macro:
+        report["macro"] = macro_benchmarks(budget, geometry)
+    report["peak_rss_kb"] = peak_rss_kb()
+    return report
+
+# (metric path, baseline, current, change) for every rate that got worse
+# than tolerance, times per call and import times counting as rates inverted
+def regressions(baseline, report, tolerance):
+    found = []
+    for name, result in report.get("micro", {}).items():
+        old = baseline.get("micro", {}).get(name)
+        if old is not None and result["ns_per_call"] > old["ns_per_call"] * (1 + tolerance):
+            found.append((f"micro.{name}.ns_per_call", old["ns_per_call"], result["ns_per_call"], result["ns_per_call"] / old["ns_per_call"] - 1))
+    for name, result in report.get("imports", {}).items():
+        old = baseline.get("imports", {}).get(name)
+        if isinstance(result, dict) and old is not None and result["import_ms"] > old["import_ms"] * (1 + tolerance):
+            found.append((f"imports.{name}.import_ms", old["import_ms"], result["import_ms"], result["import_ms"] / old["import_ms"] - 1))
+    for engine, phases in report.get("macro", {}).items():
+        for phase, result in phases.items():
+            if not isinstance(result, dict):
+                continue
+            old = baseline.get("macro", {}).get(engine, {}).get(phase)
+            for key, value in result.items():
+                if key.endswith("_per_second") and old is not None and key in old and value < old[key] * (1 - tolerance):
+                    found.append((f"macro.{engine}.{phase}.{key}", old[key], value, value / old[key] - 1))
+    return found
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Engine throughput and move latency benchmarks")
+    parser.add_argument("--budget", type=float, default=1.0, help="search time per corpus position")
+    parser.add_argument("--repeat", type=int, default=5, help="timing repeats of the microbenchmarks")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--skip-macro", action="store_true")
+    parser.add_argument("--skip-imports", action="store_true")
+    parser.add_argument("--output", help="JSON file to write, stdout if omitted")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed slowdown before a metric counts as a regression")
+    parser.add_argument("--board", default="7x6", help="board size as COLSxROWS, at least 7x6")
+    args = parser.parse_args()
+    try:
+        geometry = Rules.parse(args.board)
+    except ValueError as e:
+        parser.error(str(e))
+    if geometry.rows < Rules.STANDARD.rows or geometry.cols < Rules.STANDARD.cols:
+        parser.error("the corpus needs a board of at least 7x6")
+    report = run(args.budget, args.repeat, not args.skip_micro, not args.skip_macro, geometry, not args.skip_imports)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(baseline, report, args.tolerance)
+        for metric, old, new, change in found:
+            print(f"regression {metric}: {old:.1f} -> {new:.1f} ({change:+.0%})", file=sys.stderr)
+        sys.exit(1 if found else 0)
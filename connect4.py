@@ -1,26 +1,43 @@
-import Gameboard
-import MiniMax
-import MCTS
+import argparse
+import Rules
+from Rules import EMPTY, PLAYER, AI
 
-EMPTY = 0
-PLAYER = 1
-AI = 2
+# engines by name, their modules are only imported by make_engine so that
+# the CLI does not load the ones it does not use
+ENGINES = ["minimax", "mcts", "solver"]
+
+def make_engine(name, book=None, time_limit=None):
+    kwargs = {"book": book}
+    if time_limit is not None:
+        kwargs["time_limit"] = time_limit
+    if name == "minimax":
+        import MiniMax
+        return MiniMax.MiniMax(**kwargs)
+    if name == "solver":
+        import Solver
+        return Solver.Solver(**kwargs)
+    import MCTS
+    return MCTS.MCTS(**kwargs)
+
+def load_book():
+    import OpeningBook
+    return OpeningBook.OpeningBook.load_default()
 
 class Connect4:
 
     def main(self):
+        # pygame is only loaded for interactive games
+        import Gameboard
         while True:
-            ais = ["minimax", "mcts"]
-            ai = self.get_player_type(ais, "Select AI Type ('minimax', or 'mcts'): ")
+            ai = self.get_player_type(ENGINES, "Select AI Type ('minimax', 'mcts' or 'solver'): ")
 
             game_board = Gameboard.Gameboard(ai)
             game_board.draw_board()
 
-            if ai == "minimax":
-                MiniMax.MiniMax(game_board, AI)
-            else:
-                MCTS.MCTS(game_board, PLAYER)
-                
+            engine = make_engine(ai, load_book())
+            # MCTS lets the human move first
+            game_board.play_game(engine, PLAYER if ai == "mcts" else AI)
+
             game_board.display_winner()
 
     def get_player_type(self, ais, prompt):
@@ -31,6 +48,58 @@ class Connect4:
             else:
                 print(f"Invalid input. Please enter one of the following: {', '.join(ais)}.")
 
+# searches the position after moves with one engine and prints the board,
+# the best move and the search statistics
+def analyze(moves, engine_name="minimax", time_limit=2.0, geometry=Rules.STANDARD, book=False):
+    import Bitboard
+    position, player = Bitboard.Bitboard.from_moves(moves, PLAYER, geometry)
+    if position.is_over():
+        raise ValueError("game is already over")
+    engine = make_engine(engine_name, load_book() if book else None, time_limit)
+    try:
+        engine.set_position(position, player)
+        move, stats = engine.best_move(position, player)
+    finally:
+        engine.close()
+    symbols = {EMPTY: ".", PLAYER: "X", AI: "O"}
+    # straight from the bitboards, to_state would load numpy
+    for row in range(geometry.rows):
+        cells = []
+        for col in range(geometry.cols):
+            bit = 1 << geometry.cell_bit(row, col)
+            cells.append(symbols[PLAYER if position.boards[PLAYER] & bit else AI if position.boards[AI] & bit else EMPTY])
+        print(" ".join(cells))
+    print(" ".join(str(col) for col in range(geometry.cols)))
+    print(f"{symbols[player]} to move, best move {move}")
+    print_stats(stats)
+    return move, stats
+
+def print_stats(stats, indent="  "):
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            print(f"{indent}{key}:")
+            print_stats(value, indent + "  ")
+        elif isinstance(value, float):
+            print(f"{indent}{key}: {value:.3f}")
+        else:
+            print(f"{indent}{key}: {value}")
+
 if __name__ == "__main__":
-    game = Connect4()
-    game.main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Connect 4 against an engine, or analysis of a position")
+    commands = parser.add_subparsers(dest="command")
+    analyze_parser = commands.add_parser("analyze", help="print the best move of a position and exit")
+    analyze_parser.add_argument("moves", nargs="?", default="", help="columns played from the empty board, e.g. 3342")
+    analyze_parser.add_argument("--engine", choices=ENGINES, default="minimax")
+    analyze_parser.add_argument("--time", type=float, default=2.0, help="search time in seconds")
+    analyze_parser.add_argument("--board", default="7x6", help="board size as COLSxROWS")
+    analyze_parser.add_argument("--book", action="store_true", help="answer from the opening book when it has the position")
+    args = parser.parse_args()
+    if args.command == "analyze":
+        try:
+            geometry = Rules.parse(args.board)
+            analyze(args.moves, args.engine, args.time, geometry, args.book)
+        except ValueError as e:
+            parser.error(str(e))
+    else:
+        game = Connect4()
+        game.main()
@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+import Bitboard
+import server
+from Rules import PLAYER, AI
+
+class Client:
+
+    # one TCP connection to the move server, requests are matched to their
+    # responses by id so that many sessions can share the connection
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count()
+        self.futures = {}
+        self.listener = asyncio.create_task(self.listen())
+
+    @classmethod
+    async def connect(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+        return cls(reader, writer)
+
+    async def listen(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            response = json.loads(line)
+            future = self.futures.pop(response.get("id"), None)
+            if future is not None and not future.done():
+                future.set_result(response)
+        for future in self.futures.values():
+            future.set_exception(ConnectionError("server closed the connection"))
+
+    async def request(self, request):
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.futures[request_id] = future
+        self.writer.write(json.dumps(dict(request, id=request_id)).encode() + b"\n")
+        return await future
+
+    async def close(self):
+        self.writer.close()
+        self.listener.cancel()
+
+# plays one game against the server with random moves, returns the latency of every request
+async def play_session(client, session, engine, budget):
+    first = random.choice((PLAYER, AI))
+    position = Bitboard.Bitboard()
+    moves = []
+    player = first
+    latencies = []
+    while True:
+        if player == AI:
+            t0 = time.perf_counter()
+            response = await client.request({"op": "move", "session": session, "engine": engine, "moves": moves, "first": first, "budget": budget})
+            latencies.append(time.perf_counter() - t0)
+            if "error" in response:
+                raise RuntimeError(response["error"])
+            move = response["move"]
+        else:
+            move = random.choice(position.get_available_actions())
+        position.play(move, player)
+        moves.append(move)
+        if position.winning_move(player) or position.is_full():
+            break
+        player = AI if player == PLAYER else PLAYER
+    await client.request({"op": "end", "session": session})
+    return latencies
+
+async def run(host, port, sessions, connections, engine, budget):
+    clients = [await Client.connect(host, port) for _ in range(connections)]
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(
+        play_session(clients[i % connections], f"load-{i}", engine, budget) for i in range(sessions)
+    ))
+    elapsed = time.perf_counter() - t0
+    server_stats = await clients[0].request({"op": "stats"})
+    for client in clients:
+        await client.close()
+    latencies = [latency for session in results for latency in session]
+    return {
+        "sessions": sessions,
+        "requests": len(latencies),
+        "elapsed": elapsed,
+        "requests_per_second": len(latencies) / elapsed,
+        "latency": server.percentiles(latencies),
+        "latency_max": max(latencies),
+        "server": server_stats,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load generator for server.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4444)
+    parser.add_argument("--sessions", type=int, default=100, help="concurrent games")
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--engine", choices=server.ENGINES, default="mcts")
+    parser.add_argument("--budget", type=float, default=0.1, help="requested think time per move")
+    args = parser.parse_args()
+    report = asyncio.run(run(args.host, args.port, args.sessions, args.connections, args.engine, args.budget))
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,336 @@
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import math
+import multiprocessing as mp
+import sys
+import threading
+import time
+import zlib
+import Bitboard
+import MCTS
+import MiniMax
+import OpeningBook
+import Solver
+from Rules import PLAYER, AI
+
+ENGINES = ("minimax", "mcts", "solver")
+
+# latencies kept for the percentiles reported by the "stats" request
+LATENCY_WINDOW = 10000
+
+def make_engine(name, tt_size, book):
+    if name == "minimax":
+        return MiniMax.MiniMax(tt_size=tt_size, book=book)
+    if name == "solver":
+        return Solver.Solver(tt_size=tt_size, book=book)
+    return MCTS.MCTS(book=book)
+
+# nearest-rank percentiles of values, as {"p50": ..., ...}
+def percentiles(values, ranks=(50, 90, 99)):
+    ordered = sorted(values)
+    result = {}
+    for rank in ranks:
+        if ordered:
+            index = min(len(ordered) - 1, max(0, int(round(rank / 100 * len(ordered))) - 1))
+            result[f"p{rank}"] = ordered[index]
+        else:
+            result[f"p{rank}"] = None
+    return result
+
+# worker process: owns the engines (search trees, tables) of the sessions
+# routed to it and answers one request at a time
+def worker_main(index, requests, responses, tt_size, max_sessions, book_path):
+    # the book is memory-mapped, its pages are shared by all workers
+    book = OpeningBook.OpeningBook(book_path) if book_path else None
+    sessions = collections.OrderedDict() # session -> (engine name, engine, moves)
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        request_id, op, session, args = request
+        try:
+            if op == "end":
+                entry = sessions.pop(session, None)
+                if entry is not None:
+                    entry[1].close()
+                result = {"ended": entry is not None}
+            else:
+                result = worker_move(sessions, session, args, tt_size, book)
+                # least recently used sessions are dropped, a later request
+                # rebuilds them from its move list
+                while len(sessions) > max_sessions:
+                    sessions.popitem(last=False)[1][1].close()
+        except ValueError as e:
+            result = {"error": str(e)}
+        except Exception as e: # keep the worker alive, report the failure
+            result = {"error": f"internal error: {e!r}"}
+        responses.put((index, request_id, result))
+
+def worker_move(sessions, session, args, tt_size, book):
+    name = args["engine"]
+    moves = args["moves"]
+    first = args["first"]
+    position, player = Bitboard.Bitboard.from_moves(moves, first)
+    if position.is_over():
+        raise ValueError("game is already over")
+    # from_moves also takes digit strings, the session compares and plays ints
+    moves = [int(move) for move in moves]
+    entry = sessions.pop(session, None)
+    if entry is not None and entry[0] == name and moves[:len(entry[2])] == entry[2]:
+        # same game: only report the moves played since the last request
+        engine = entry[1]
+        mover = first if len(entry[2]) % 2 == 0 else (AI if first == PLAYER else PLAYER)
+        for move in moves[len(entry[2]):]:
+            engine.play(move, mover)
+            mover = AI if mover == PLAYER else PLAYER
+    else:
+        if entry is not None:
+            entry[1].close()
+        engine = make_engine(name, tt_size, book)
+        engine.set_position(position, player)
+    move, stats = engine.best_move(position, player, args["budget"])
+    sessions[session] = (name, engine, moves)
+    return {"move": move, "stats": stats}
+
+class MoveServer:
+
+    # requests of a session always go to the same worker so that its search
+    # state is reused; every worker runs one search at a time, picking the
+    # next request round-robin over its sessions, and the think time is cut
+    # so that a worker's backlog drains within max_latency seconds
+    def __init__(self, workers=None, think_time=1.0, min_think_time=0.05, max_latency=5.0, tt_size=1 << 14, max_sessions=1000, book_path=None):
+        self.num_workers = workers or mp.cpu_count()
+        self.think_time = think_time
+        self.min_think_time = min_think_time
+        self.max_latency = max_latency
+        self.tt_size = tt_size
+        self.max_sessions = max_sessions
+        self.book_path = book_path
+        self.request_ids = itertools.count()
+        # answered move requests and their latencies ("end" is not counted)
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.completed = 0
+        self.futures = {}
+        self.processes = []
+        self.queues = []
+        self.responses = None
+        self.reader = None
+        self.loop = None
+        # per worker: sessions with waiting jobs, the jobs of each session, busy flag
+        self.ready = [collections.deque() for _ in range(self.num_workers)]
+        self.jobs = [{} for _ in range(self.num_workers)]
+        self.busy = [False] * self.num_workers
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.responses = mp.Queue()
+        for index in range(self.num_workers):
+            requests = mp.Queue()
+            process = mp.Process(target=worker_main, args=(index, requests, self.responses, self.tt_size, self.max_sessions, self.book_path), daemon=True)
+            process.start()
+            self.queues.append(requests)
+            self.processes.append(process)
+        self.reader = threading.Thread(target=self.read_responses, daemon=True)
+        self.reader.start()
+
+    def stop(self):
+        for requests in self.queues:
+            requests.put(None)
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        # the reader must be done before the interpreter tears the queue down
+        self.responses.put(None)
+        self.reader.join()
+        for queue in self.queues + [self.responses]:
+            queue.close()
+            queue.join_thread()
+
+    # runs in a thread: hands worker results back to the event loop
+    def read_responses(self):
+        while True:
+            response = self.responses.get()
+            if response is None:
+                break
+            self.loop.call_soon_threadsafe(self.complete, *response)
+
+    def complete(self, index, request_id, result):
+        future = self.futures.pop(request_id)
+        if not future.done():
+            future.set_result(result)
+        self.busy[index] = False
+        self.dispatch(index)
+
+    def worker_for(self, session):
+        return zlib.crc32(session.encode()) % self.num_workers
+
+    def submit(self, op, session, args):
+        index = self.worker_for(session)
+        future = self.loop.create_future()
+        jobs = self.jobs[index]
+        if session not in jobs:
+            jobs[session] = collections.deque()
+            self.ready[index].append(session)
+        jobs[session].append((op, args, future))
+        self.dispatch(index)
+        return future
+
+    def dispatch(self, index):
+        if self.busy[index] or not self.ready[index]:
+            return
+        jobs = self.jobs[index]
+        session = self.ready[index].popleft()
+        op, args, future = jobs[session].popleft()
+        if jobs[session]:
+            self.ready[index].append(session)
+        else:
+            del jobs[session]
+        if op == "move":
+            waiting = sum(len(queue) for queue in jobs.values())
+            budget = min(args["budget"], max(self.min_think_time, self.max_latency / (waiting + 1)))
+            args = dict(args, budget=budget)
+        request_id = next(self.request_ids)
+        self.futures[request_id] = future
+        self.busy[index] = True
+        self.queues[index].put((request_id, op, session, args))
+
+    def stats(self):
+        latencies = list(self.latencies)
+        return {
+            "completed": self.completed,
+            "workers": self.num_workers,
+            "queued": sum(len(queue) for jobs in self.jobs for queue in jobs.values()),
+            "latency": percentiles(latencies),
+            "latency_max": max(latencies) if latencies else None,
+        }
+
+    async def handle(self, request):
+        t0 = time.perf_counter()
+        op = request.get("op", "move")
+        if op == "stats":
+            return self.stats()
+        session = request.get("session")
+        if not isinstance(session, str):
+            return {"error": "missing session"}
+        if op == "end":
+            # not a search, kept out of the move latencies
+            return await self.submit("end", session, None)
+        if op == "move":
+            engine = request.get("engine", "mcts")
+            if engine not in ENGINES:
+                return {"error": f"unknown engine {engine!r}"}
+            moves = request.get("moves", [])
+            if not isinstance(moves, list):
+                return {"error": "moves must be a list of columns"}
+            budget = request.get("budget", self.think_time)
+            if isinstance(budget, bool) or not isinstance(budget, (int, float)) or not 0 < budget < math.inf:
+                return {"error": f"budget must be a positive number of seconds, not {budget!r}"}
+            args = {
+                "engine": engine,
+                "moves": moves,
+                "first": AI if request.get("first") == AI else PLAYER,
+                "budget": float(budget),
+            }
+            result = await self.submit("move", session, args)
+        else:
+            return {"error": f"unknown op {op!r}"}
+        latency = time.perf_counter() - t0
+        self.latencies.append(latency)
+        self.completed += 1
+        result["latency"] = latency
+        return result
+
+    async def respond(self, line, write):
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+        except ValueError as e:
+            await write({"error": f"bad request: {e}"})
+            return
+        try:
+            response = await self.handle(request)
+        except Exception as e: # every request gets an answer
+            response = {"error": f"internal error: {e!r}"}
+        if "id" in request:
+            response["id"] = request["id"]
+        await write(response)
+
+    # answers every JSON line of reader as soon as its search is done,
+    # requests of a connection may complete out of order (match them by "id")
+    async def serve_stream(self, reader, write):
+        tasks = set()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            task = asyncio.create_task(self.respond(line, write))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    # responses wait for the socket buffer to drain, so that a client that
+    # does not read cannot make the server buffer without bound
+    async def handle_connection(self, reader, writer):
+        lock = asyncio.Lock()
+        async def write(response):
+            async with lock:
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        try:
+            await self.serve_stream(reader, write)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve_tcp(self, host, port):
+        self.start()
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=1 << 20)
+        print(f"serving on {host}:{port} with {self.num_workers} workers", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.stop()
+
+    async def serve_stdio(self):
+        self.start()
+        reader = asyncio.StreamReader(limit=1 << 20)
+        await self.loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        async def write(response):
+            sys.stdout.write(json.dumps(response) + "\n")
+            sys.stdout.flush()
+        try:
+            await self.serve_stream(reader, write)
+        finally:
+            self.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Connect 4 move server (JSON lines)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4444)
+    parser.add_argument("--stdio", action="store_true", help="serve stdin/stdout instead of TCP")
+    parser.add_argument("--workers", type=int, default=mp.cpu_count())
+    parser.add_argument("--think-time", type=float, default=1.0, help="default search budget per move")
+    parser.add_argument("--min-think-time", type=float, default=0.05)
+    parser.add_argument("--max-latency", type=float, default=5.0, help="target time for a worker's backlog to drain")
+    parser.add_argument("--tt-size", type=int, default=1 << 14, help="transposition table entries per minimax session")
+    parser.add_argument("--max-sessions", type=int, default=1000, help="sessions kept per worker")
+    parser.add_argument("--book", help="opening book file (see OpeningBook.py)")
+    args = parser.parse_args()
+    server = MoveServer(args.workers, args.think_time, args.min_think_time, args.max_latency, args.tt_size, args.max_sessions, args.book)
+    try:
+        if args.stdio:
+            asyncio.run(server.serve_stdio())
+        else:
+            asyncio.run(server.serve_tcp(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
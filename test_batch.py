@@ -0,0 +1,48 @@
+import random
+import unittest
+import numpy as np
+import BatchRollout
+import Rules
+import utils
+from Rules import PLAYER, AI
+from test_bitboard import SIZES, random_positions
+
+class BatchTest(unittest.TestCase):
+
+    def test_batch_checks_match_scalar(self):
+        rng = random.Random(7)
+        for rows, cols in SIZES:
+            geometry = Rules.geometry(rows, cols)
+            boards = [board for board, _ in random_positions(geometry, 300, rng)]
+            inputs = [np.array([board.to_state() for board in boards])]
+            if geometry.fits_uint64:
+                inputs.append(boards)
+            legal = np.array([[board.can_play(c) for c in range(cols)] for board in boards])
+            for states in inputs:
+                self.assertTrue((utils.get_available_actions_batch(states) == legal).all())
+                for player in (PLAYER, AI):
+                    won = np.array([board.winning_move(player) for board in boards])
+                    terminal = np.array([bool(utils.is_terminal_node(board, player)) for board in boards])
+                    self.assertTrue((utils.winning_move_batch(states, player) == won).all())
+                    self.assertTrue((utils.is_terminal_node_batch(states, player) == terminal).all())
+
+    def test_bitboards_must_fit_in_64_bits(self):
+        boards = [board for board, _ in random_positions(Rules.parse("9x7"), 3, random.Random(9))]
+        with self.assertRaises(ValueError):
+            utils.winning_move_batch(boards, PLAYER)
+
+    def test_winning_cells_batch_matches_scalar(self):
+        rng = random.Random(8)
+        for rows, cols in SIZES[:3]:
+            geometry = Rules.geometry(rows, cols)
+            boards = [board for board, _ in random_positions(geometry, 300, rng)]
+            mine = np.array([board.boards[PLAYER] for board in boards], dtype=np.uint64)
+            mask = np.array([board.mask for board in boards], dtype=np.uint64)
+            cells = BatchRollout.winning_cells_batch(mine, mask, geometry)
+            playable = BatchRollout.playable_cells_batch(mask, geometry)
+            for i, board in enumerate(boards):
+                self.assertEqual(int(cells[i]), geometry.winning_cells(board.boards[PLAYER], board.mask))
+                self.assertEqual(int(playable[i]), board.available_mask())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+import benchmark
+import Rules
+
+class BenchmarkTest(unittest.TestCase):
+
+    def test_corpus_positions(self):
+        geometry = Rules.STANDARD
+        for board, player in benchmark.corpus_positions(geometry):
+            self.assertFalse(board.is_over())
+            self.assertFalse(geometry.winning_cells(board.boards[player], board.mask) & board.available_mask())
+        # larger boards replay the same moves
+        for board, _ in benchmark.corpus_positions(Rules.parse("8x7")):
+            self.assertFalse(board.is_over())
+
+    def test_macro_engines_report_their_own_peak(self):
+        report = benchmark.macro_benchmarks(0.01)
+        self.assertEqual(set(report), set(benchmark.MACRO_ENGINES))
+        for name, results in report.items():
+            self.assertGreater(results["peak_rss_kb"], 0)
+            self.assertEqual(set(results) - {"peak_rss_kb", "bytes_per_node"}, set(benchmark.CORPUS))
+        self.assertIn("bytes_per_node", report["mcts"])
+
+    def test_regressions(self):
+        baseline = {
+            "micro": {"eval_board": {"ns_per_call": 1000.0}},
+            "macro": {"mcts": {"opening": {"playouts_per_second": 100.0}, "peak_rss_kb": 10}},
+        }
+        report = {
+            "micro": {"eval_board": {"ns_per_call": 1200.0}},
+            "macro": {"mcts": {"opening": {"playouts_per_second": 95.0}, "peak_rss_kb": 20}},
+        }
+        found = benchmark.regressions(baseline, report, 0.10)
+        self.assertEqual([metric for metric, _, _, _ in found], ["micro.eval_board.ns_per_call"])
+        found = benchmark.regressions(baseline, report, 0.01)
+        self.assertEqual([metric for metric, _, _, _ in found], ["micro.eval_board.ns_per_call", "macro.mcts.opening.playouts_per_second"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import random
+import unittest
+import Bitboard
+import Rules
+from Rules import PLAYER, AI
+
+# cross-checks of the bitboard operations against slow but obvious
+# implementations on random positions of several board sizes; the other
+# test modules draw their positions from random_positions. Run them with
+# python -m unittest or pytest
+
+SIZES = [(6, 7), (7, 8), (4, 4), (7, 9)]
+
+# random positions of geometry reached by legal games, none of them past a
+# four; each is (board, player to move)
+def random_positions(geometry, count, rng, max_moves=None):
+    positions = []
+    for _ in range(count):
+        board = Bitboard.Bitboard(geometry)
+        player = PLAYER
+        for _ in range(rng.randrange((max_moves or geometry.size) + 1)):
+            if board.is_over():
+                break
+            board.play(rng.choice(board.get_available_actions()), player)
+            player = AI if player == PLAYER else PLAYER
+        positions.append((board, player))
+    return positions
+
+# four in a row for player on a (rows, cols) cell array, cell by cell
+def brute_force_win(state, player):
+    rows, cols = state.shape
+    for r in range(rows):
+        for c in range(cols):
+            for dr, dc in ((0, 1), (1, 0), (1, 1), (-1, 1)):
+                cells = [(r + i * dr, c + i * dc) for i in range(Rules.CONNECT)]
+                if all(0 <= row < rows and 0 <= col < cols and state[row][col] == player for row, col in cells):
+                    return True
+    return False
+
+class BitboardTest(unittest.TestCase):
+
+    def test_winning_move_matches_cell_scan(self):
+        rng = random.Random(1)
+        for rows, cols in SIZES:
+            for board, _ in random_positions(Rules.geometry(rows, cols), 300, rng):
+                state = board.to_state()
+                for player in (PLAYER, AI):
+                    self.assertEqual(board.winning_move(player), brute_force_win(state, player))
+
+    def test_state_round_trip_and_hash(self):
+        rng = random.Random(2)
+        for rows, cols in SIZES:
+            for board, _ in random_positions(Rules.geometry(rows, cols), 100, rng):
+                rebuilt = Bitboard.Bitboard.from_state(board.to_state())
+                self.assertEqual(rebuilt.boards, board.boards)
+                self.assertEqual(rebuilt.heights, board.heights)
+                # the hash only depends on the pieces, not on the move order
+                self.assertEqual(rebuilt.hash, board.hash)
+
+    def test_undo_restores_position(self):
+        rng = random.Random(3)
+        for board, player in random_positions(Rules.STANDARD, 200, rng):
+            before = board.copy()
+            for action in board.get_available_actions():
+                board.play(action, player)
+                board.undo(action, player)
+                self.assertEqual((board.boards, board.heights, board.moves, board.hash), (before.boards, before.heights, before.moves, before.hash))
+
+    def test_winning_cells_match_trial_moves(self):
+        rng = random.Random(4)
+        for rows, cols in SIZES:
+            geometry = Rules.geometry(rows, cols)
+            for board, player in random_positions(geometry, 200, rng):
+                expected = 0
+                for action in board.get_available_actions():
+                    bit = board.heights[action]
+                    board.play(action, player)
+                    if board.winning_move(player):
+                        expected |= 1 << bit
+                    board.undo(action, player)
+                self.assertEqual(geometry.winning_cells(board.boards[player], board.mask) & board.available_mask(), expected)
+
+if __name__ == "__main__":
+    unittest.main()
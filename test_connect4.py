@@ -0,0 +1,50 @@
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import unittest
+import Bitboard
+import Rules
+import connect4
+from Rules import PLAYER, AI
+
+class FromMovesTest(unittest.TestCase):
+
+    def test_from_moves(self):
+        board, player = Bitboard.Bitboard.from_moves("3342")
+        self.assertEqual(player, PLAYER)
+        self.assertEqual(board.heights[3] - 3 * Rules.STANDARD.height, 2)
+        for moves in ("3x", [7], [True], "0000000", "01010101"):
+            with self.assertRaises(ValueError):
+                Bitboard.Bitboard.from_moves(moves)
+
+    def test_ints_and_digits_replay_alike(self):
+        board, player = Bitboard.Bitboard.from_moves([3, "3", 4], AI, Rules.parse("8x7"))
+        expected, _ = Bitboard.Bitboard.from_moves("334", AI, Rules.parse("8x7"))
+        self.assertEqual((board.boards, board.geometry, player), (expected.boards, expected.geometry, PLAYER))
+
+class AnalyzeTest(unittest.TestCase):
+
+    def test_prints_the_position_and_best_move(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            move, stats = connect4.analyze("334455", "minimax", 0.05)
+        self.assertIn(move, (2, 6))
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[4:6], [". . . O O O .", ". . . X X X ."])
+        self.assertEqual(lines[6], "0 1 2 3 4 5 6")
+        self.assertEqual(lines[7], f"X to move, best move {move}")
+
+    def test_rejects_finished_games(self):
+        with self.assertRaises(ValueError):
+            connect4.analyze("0101010", "minimax", 0.05)
+
+    def test_cold_start_loads_neither_numpy_nor_pygame(self):
+        code = "import sys, connect4; print(sorted(m for m in ('numpy', 'pygame', 'MCTS', 'MiniMax') if m in sys.modules))"
+        directory = os.path.dirname(os.path.abspath(__file__))
+        result = subprocess.run([sys.executable, "-c", code], cwd=directory, check=True, capture_output=True, text=True)
+        self.assertEqual(result.stdout.strip(), "[]")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import Bitboard
+import MCTS
+import MiniMax
+import Rules
+import Solver
+from Rules import PLAYER, AI
+
+# every engine with a short budget
+def make_engines():
+    return [MiniMax.MiniMax(time_limit=0.05), MCTS.MCTS(time_limit=0.05), Solver.Solver(time_limit=0.05)]
+
+class EngineTest(unittest.TestCase):
+
+    def test_follows_played_moves(self):
+        for engine in make_engines():
+            with self.subTest(engine=type(engine).__name__):
+                position = Bitboard.Bitboard()
+                engine.set_position(position, PLAYER)
+                player = PLAYER
+                for _ in range(6):
+                    move, _ = engine.best_move(position, player)
+                    self.assertTrue(position.can_play(move))
+                    position.play(move, player)
+                    engine.play(move, player)
+                    player = AI if player == PLAYER else PLAYER
+                    self.assertTrue(engine.in_sync(position, player))
+                engine.close()
+
+    def test_starts_over_from_other_positions(self):
+        position, player = Bitboard.Bitboard.from_moves("3342")
+        for engine in make_engines():
+            with self.subTest(engine=type(engine).__name__):
+                self.assertFalse(engine.in_sync(position, player))
+                move, _ = engine.best_move(position, player)
+                self.assertTrue(engine.in_sync(position, player))
+                self.assertTrue(position.can_play(move))
+                engine.close()
+
+    def test_mcts_root_takes_the_side_to_move(self):
+        engine = MCTS.MCTS(time_limit=0.05)
+        position = Bitboard.Bitboard()
+        engine.set_position(position, PLAYER)
+        engine.best_move(position, PLAYER)
+        # same pieces, the other side to move: a new tree whose root was
+        # reached by PLAYER
+        self.assertFalse(engine.in_sync(position, AI))
+        engine.best_move(position, AI)
+        self.assertEqual(engine.pool.player[engine.root_node_id], PLAYER)
+        for child in engine.pool.children(engine.root_node_id):
+            self.assertEqual(engine.pool.player[child], AI)
+        engine.close()
+
+    def test_starts_over_on_another_board_size(self):
+        wide = Rules.parse("8x7")
+        for engine in make_engines():
+            with self.subTest(engine=type(engine).__name__):
+                engine.set_position(Bitboard.Bitboard(), PLAYER)
+                # both boards are empty, only the geometry tells them apart
+                position = Bitboard.Bitboard(wide)
+                self.assertFalse(engine.in_sync(position, PLAYER))
+                move, _ = engine.best_move(position, PLAYER)
+                self.assertIs(engine.board.geometry, wide)
+                self.assertIn(move, range(wide.cols))
+                # the same size passed differently is the same board
+                self.assertTrue(engine.in_sync(Bitboard.Bitboard(Rules.geometry(cols=8, rows=7)), PLAYER))
+                engine.close()
+
+if __name__ == "__main__":
+    unittest.main()
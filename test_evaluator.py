@@ -0,0 +1,63 @@
+import random
+import unittest
+import Bitboard
+import Evaluator
+import Rules
+import utils
+from Rules import PLAYER, AI
+from test_bitboard import SIZES, random_positions
+
+class EvaluatorTest(unittest.TestCase):
+
+    def test_incremental_matches_full_evaluation(self):
+        rng = random.Random(5)
+        for rows, cols in SIZES:
+            geometry = Rules.geometry(rows, cols)
+            for board, player in random_positions(geometry, 100, rng):
+                evaluator = Evaluator.Evaluator.from_board(board)
+                for action in board.get_available_actions():
+                    bit = board.heights[action]
+                    evaluator.play(bit, player)
+                    board.play(action, player)
+                    full = Evaluator.Evaluator.from_board(board)
+                    for side in (PLAYER, AI):
+                        self.assertEqual(evaluator.evaluate(side), full.evaluate(side))
+                        self.assertEqual(evaluator.evaluate(side), utils.eval_board(board, side))
+                    board.undo(action, player)
+                    evaluator.undo(bit, player)
+
+    def test_whole_games_played_and_undone(self):
+        rng = random.Random(7)
+        for rows, cols in SIZES:
+            geometry = Rules.geometry(rows, cols)
+            for _ in range(20):
+                board = Bitboard.Bitboard(geometry)
+                evaluator = Evaluator.Evaluator(geometry)
+                player = PLAYER
+                played = []
+                while not board.is_over():
+                    action = rng.choice(board.get_available_actions())
+                    evaluator.play(board.heights[action], player)
+                    board.play(action, player)
+                    played.append((action, player))
+                    self.assertEqual(evaluator.evaluate(player), utils.eval_board(board, player))
+                    player = AI if player == PLAYER else PLAYER
+                for action, player in reversed(played):
+                    board.undo(action, player)
+                    evaluator.undo(board.heights[action], player)
+                self.assertEqual((evaluator.scores, evaluator.fours), ([0, 0, 0], [0, 0, 0]))
+                self.assertEqual(evaluator.counts, Evaluator.Evaluator(geometry).counts)
+
+    def test_batch_matches_scalar(self):
+        rng = random.Random(6)
+        for rows, cols in SIZES[:3]:
+            geometry = Rules.geometry(rows, cols)
+            positions = random_positions(geometry, 300, rng)
+            mine = [board.boards[PLAYER] for board, _ in positions]
+            theirs = [board.boards[AI] for board, _ in positions]
+            scores = Evaluator.evaluate_batch(mine, theirs, geometry)
+            for (board, _), score in zip(positions, scores):
+                self.assertEqual(score, Evaluator.Evaluator.from_board(board).evaluate(PLAYER))
+
+if __name__ == "__main__":
+    unittest.main()
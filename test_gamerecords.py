@@ -0,0 +1,96 @@
+import os
+import random
+import tempfile
+import unittest
+import Bitboard
+import GameRecords
+import Rules
+from Rules import PLAYER, AI
+
+# random legal games played to the end, as (first, moves)
+def random_games(count, rng, geometry=Rules.STANDARD):
+    games = []
+    for _ in range(count):
+        first = rng.choice((PLAYER, AI))
+        board = Bitboard.Bitboard(geometry)
+        player = first
+        moves = []
+        while not board.is_over():
+            move = rng.choice(board.get_available_actions())
+            board.play(move, player)
+            moves.append(move)
+            player = AI if player == PLAYER else PLAYER
+        games.append((first, moves))
+    return games
+
+class GameRecordsTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "games.c4gr")
+
+    def write(self, games, buffer_size=1 << 16):
+        with GameRecords.GameWriter(self.path, buffer_size) as writer:
+            return [writer.write(moves, first) for first, moves in games]
+
+    def read(self):
+        with GameRecords.GameReader(self.path) as reader:
+            return [(offset, first, moves) for offset, first, moves in reader]
+
+    def test_round_trip(self):
+        games = random_games(200, random.Random(1)) + [(PLAYER, [])]
+        offsets = self.write(games, buffer_size=64)
+        self.assertEqual(self.read(), [(offset, first, moves) for offset, (first, moves) in zip(offsets, games)])
+
+    def test_append(self):
+        rng = random.Random(2)
+        games = random_games(20, rng)
+        more = random_games(20, rng)
+        offsets = self.write(games) + self.write(more)
+        self.assertEqual([offset for offset, _, _ in self.read()], offsets)
+        self.assertEqual([(first, moves) for _, first, moves in self.read()], games + more)
+
+    def test_append_drops_a_partial_record(self):
+        rng = random.Random(3)
+        games = random_games(10, rng)
+        more = random_games(3, rng)
+        self.write(games)
+        os.truncate(self.path, os.path.getsize(self.path) - 2)
+        # the reader stops at the cut record
+        self.assertEqual([(first, moves) for _, first, moves in self.read()], games[:-1])
+        self.write(more)
+        self.assertEqual([(first, moves) for _, first, moves in self.read()], games[:-1] + more)
+
+    def test_rejects_other_files(self):
+        with open(self.path, "wb") as f:
+            f.write(b"not a stream")
+        with self.assertRaises(ValueError):
+            GameRecords.GameWriter(self.path)
+        with self.assertRaises(ValueError):
+            GameRecords.GameReader(self.path)
+
+    def test_encode_limits(self):
+        self.assertTrue(GameRecords.supports(Rules.parse("8x7")))
+        self.assertFalse(GameRecords.supports(Rules.parse("9x7")))
+        self.assertFalse(GameRecords.supports(Rules.parse("8x8")))
+        with self.assertRaises(ValueError):
+            GameRecords.encode([8])
+        with self.assertRaises(ValueError):
+            GameRecords.encode([0] * 64)
+
+    def test_index_lookup(self):
+        games = random_games(50, random.Random(4))
+        offsets = self.write(games)
+        index_path = self.path + ".index"
+        with GameRecords.GameReader(self.path) as reader:
+            count = GameRecords.build_index(reader, index_path, plies=6)
+        self.assertEqual(count, sum(min(len(moves), 6) for _, moves in games))
+        index = GameRecords.PositionIndex(index_path)
+        self.assertEqual(len(index), count)
+        for offset, (first, moves) in zip(offsets, games):
+            for position, player in GameRecords.replay(moves[:6], first):
+                self.assertIn(offset, index.lookup(position, player))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import math
+import random
+import unittest
+import Bitboard
+import MiniMax
+import Rules
+import utils
+from Rules import PLAYER, AI
+from test_bitboard import random_positions
+
+# score of board at depth plies for maximize_player by plain minimax: no
+# pruning, no table, the heuristic recomputed at every leaf; a move making
+# four ends the search like in MiniMax.minimax
+def plain_minimax(board, depth, maximize_player, player):
+    if board.is_full():
+        return 0
+    if depth == 0:
+        return utils.eval_board(board, maximize_player)
+    opp = AI if player == PLAYER else PLAYER
+    scores = []
+    for action in board.get_available_actions():
+        board.play(action, player)
+        if board.winning_move(player):
+            board.undo(action, player)
+            return math.inf if player == maximize_player else -math.inf
+        scores.append(plain_minimax(board, depth - 1, maximize_player, opp))
+        board.undo(action, player)
+    return max(scores) if player == maximize_player else min(scores)
+
+class MiniMaxTest(unittest.TestCase):
+
+    def check_against_plain_minimax(self, geometry, depth, count, seed):
+        for board, player in random_positions(geometry, count, random.Random(seed)):
+            if board.is_over():
+                continue
+            engine = MiniMax.MiniMax(time_limit=math.inf, max_depth=depth, tt_size=1 << 12)
+            move, stats = engine.best_move(board, player)
+            expected = plain_minimax(board, depth, player, player)
+            self.assertEqual(stats["score"], expected)
+            # the move reaches the score
+            board.play(move, player)
+            if not board.winning_move(player):
+                self.assertEqual(plain_minimax(board, depth - 1, player, AI if player == PLAYER else PLAYER), expected)
+            engine.close()
+
+    def test_standard_board(self):
+        self.check_against_plain_minimax(Rules.STANDARD, 4, 40, 1)
+
+    def test_small_board(self):
+        self.check_against_plain_minimax(Rules.geometry(4, 5), 5, 30, 2)
+
+    def test_takes_a_win_and_blocks_one(self):
+        engine = MiniMax.MiniMax(time_limit=0.2)
+        # wins at either end of an open three, wins at 3, blocks 3
+        for moves, expected in (("334455", {2, 6}), ("001122", {3}), ("00112", {3})):
+            position, player = Bitboard.Bitboard.from_moves(moves)
+            self.assertIn(engine.best_move(position, player)[0], expected)
+        engine.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import random
+import unittest
+import Bitboard
+import MCTS
+import NodePool
+from Rules import PLAYER, AI
+
+# (move, player, visits, wins, untried, children) of the tree under node
+def tree(pool, node):
+    children = sorted(tree(pool, child) for child in pool.children(node))
+    return (pool.move[node], pool.player[node], pool.visits[node], pool.wins[node], pool.untried[node], children)
+
+def size(pool, node):
+    return 1 + sum(size(pool, child) for child in pool.children(node))
+
+class NodePoolTest(unittest.TestCase):
+
+    def test_grows_and_links_children(self):
+        pool = NodePool.NodePool(capacity=2)
+        root = pool.new_node(NodePool.NO_NODE, -1, AI)
+        children = [pool.add_child(root, move, PLAYER) for move in range(7)]
+        self.assertEqual(pool.size, 8)
+        self.assertGreaterEqual(pool.capacity, 8)
+        self.assertEqual(sorted(pool.children(root)), children)
+        self.assertEqual(pool.find_child(root, 4), children[4])
+        self.assertEqual(pool.find_child(root, 7), NodePool.NO_NODE)
+        self.assertEqual([pool.parent[child] for child in children], [root] * 7)
+
+    def test_memory_usage(self):
+        pool = NodePool.NodePool(capacity=100)
+        # visits, wins, parent, first_child, next_sibling and untried as
+        # 4-byte ints, move and player as bytes
+        self.assertEqual(pool.bytes_per_node(), 6 * 4 + 2)
+        self.assertEqual(pool.memory_usage(), 100 * pool.bytes_per_node())
+        self.assertEqual(pool.memory_usage(), sum(len(buffer) * buffer.itemsize for buffer in pool.buffers))
+
+    def test_subtree(self):
+        rng = random.Random(1)
+        pool = NodePool.NodePool(capacity=4)
+        nodes = [pool.new_node(NodePool.NO_NODE, -1, AI)]
+        for _ in range(500):
+            parent = rng.choice(nodes)
+            child = pool.add_child(parent, rng.randrange(7), AI if pool.player[parent] == PLAYER else PLAYER)
+            pool.visits[child] = rng.randrange(100)
+            pool.wins[child] = rng.randrange(100)
+            pool.untried[child] = rng.randrange(128)
+            nodes.append(child)
+        for node in rng.sample(nodes, 20) + [0]:
+            new_pool = pool.subtree(node)
+            self.assertEqual(tree(new_pool, 0), tree(pool, node))
+            self.assertEqual(new_pool.size, size(pool, node))
+            self.assertEqual((new_pool.parent[0], new_pool.next_sibling[0]), (NodePool.NO_NODE, NodePool.NO_NODE))
+            for new in range(1, new_pool.size):
+                self.assertIn(new, new_pool.children(new_pool.parent[new]))
+
+    def test_mcts_keeps_the_played_subtree(self):
+        engine = MCTS.MCTS(time_limit=0.05)
+        position = Bitboard.Bitboard()
+        engine.set_position(position, PLAYER)
+        move, _ = engine.best_move(position, PLAYER)
+        child = engine.pool.find_child(engine.root_node_id, move)
+        expected = tree(engine.pool, child)
+        engine.play(move, PLAYER)
+        position.play(move, PLAYER)
+        self.assertEqual(tree(engine.pool, engine.root_node_id), expected)
+        self.assertEqual(engine.pool.size, size(engine.pool, engine.root_node_id))
+        # the opponent's reply keeps its subtree too, and the search goes on
+        # from there
+        reply = max(engine.pool.children(engine.root_node_id), key=lambda node: engine.pool.visits[node])
+        visits = engine.pool.visits[reply]
+        # play() replaces the pool, node ids of the old one mean nothing after it
+        reply_move = engine.pool.move[reply]
+        engine.play(reply_move, AI)
+        position.play(reply_move, AI)
+        self.assertTrue(engine.in_sync(position, PLAYER))
+        self.assertEqual(engine.pool.visits[engine.root_node_id], visits)
+        engine.best_move(position, PLAYER)
+        self.assertGreater(engine.pool.visits[engine.root_node_id], visits)
+
+    def test_reported_in_mcts_stats(self):
+        engine = MCTS.MCTS(time_limit=0.05)
+        position = Bitboard.Bitboard()
+        engine.set_position(position, PLAYER)
+        _, stats = engine.best_move(position, PLAYER)
+        self.assertEqual(stats["bytes_per_node"], engine.pool.bytes_per_node())
+        self.assertEqual(stats["memory_bytes"], engine.pool.memory_usage())
+        self.assertGreaterEqual(stats["memory_bytes"], stats["nodes"] * stats["bytes_per_node"])
+
+if __name__ == "__main__":
+    unittest.main()
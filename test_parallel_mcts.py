@@ -0,0 +1,51 @@
+import unittest
+import Bitboard
+import ParallelMCTS
+from Rules import PLAYER, AI
+
+class ParallelMCTSTest(unittest.TestCase):
+
+    def children_visits(self, engine):
+        pool = engine.pool
+        return {pool.move[child]: pool.visits[child] for child in pool.children(engine.root_node_id)}
+
+    def test_root_mode_merges_into_the_tree(self):
+        engine = ParallelMCTS.ParallelMCTS(0.1, workers=2, mode=ParallelMCTS.ROOT)
+        try:
+            position, player = Bitboard.Bitboard.from_moves("33")
+            engine.set_position(position, player)
+            move, stats = engine.best_move(position, player)
+            visits = self.children_visits(engine)
+            self.assertEqual(move, max(visits, key=visits.get))
+            self.assertEqual(sum(visits.values()), stats["playouts"])
+            self.assertEqual(stats["root_visits"], stats["playouts"])
+            # a second search adds to the counts of the first
+            _, more = engine.best_move(position, player)
+            self.assertEqual(more["root_visits"], stats["playouts"] + more["playouts"])
+            visits = self.children_visits(engine)
+            # the played move keeps its counts
+            engine.play(move, player)
+            self.assertEqual(engine.pool.visits[engine.root_node_id], visits[move])
+        finally:
+            engine.close()
+
+    def test_leaf_mode_removes_virtual_losses(self):
+        engine = ParallelMCTS.ParallelMCTS(0.1, workers=2, mode=ParallelMCTS.LEAF, batch_size=8)
+        try:
+            position = Bitboard.Bitboard()
+            engine.set_position(position, PLAYER)
+            move, stats = engine.best_move(position, PLAYER)
+            self.assertTrue(position.can_play(move))
+            # every playout went through one child of the root, and left no
+            # pending visit behind
+            self.assertEqual(stats["root_visits"], stats["playouts"])
+            self.assertEqual(sum(self.children_visits(engine).values()), stats["playouts"])
+            pool = engine.pool
+            for node in range(pool.size):
+                self.assertGreaterEqual(pool.visits[node], sum(pool.visits[child] for child in pool.children(node)))
+                self.assertLessEqual(pool.wins[node], pool.visits[node])
+        finally:
+            engine.close()
+
+if __name__ == "__main__":
+    unittest.main()
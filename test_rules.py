@@ -0,0 +1,32 @@
+import pickle
+import unittest
+import Bitboard
+import Rules
+from Rules import PLAYER
+
+class GeometryTest(unittest.TestCase):
+
+    def test_one_instance_per_size(self):
+        self.assertIs(Rules.geometry(), Rules.STANDARD)
+        self.assertIs(Rules.geometry(6, 7), Rules.STANDARD)
+        self.assertIs(Rules.geometry(rows=6, cols=7), Rules.STANDARD)
+        self.assertIs(Rules.geometry(6, cols=7), Rules.STANDARD)
+        self.assertIs(Rules.parse("7x6"), Rules.STANDARD)
+        self.assertIs(Bitboard.Bitboard.from_state(Bitboard.Bitboard().to_state()).geometry, Rules.STANDARD)
+        self.assertIs(Rules.geometry(cols=8, rows=7), Rules.parse("8x7"))
+
+    def test_parse(self):
+        geometry = Rules.parse("9X7")
+        self.assertEqual((geometry.rows, geometry.cols, geometry.name), (7, 9, "9x7"))
+        self.assertFalse(geometry.fits_uint64)
+        for name in ("7", "7x", "axb", "3x6"):
+            with self.assertRaises(ValueError):
+                Rules.parse(name)
+
+    def test_pickles_to_shared_instance(self):
+        board, _ = Bitboard.Bitboard.from_moves("3342", PLAYER, Rules.geometry(7, 8))
+        self.assertIs(pickle.loads(pickle.dumps(board)).geometry, Rules.geometry(7, 8))
+        self.assertIs(pickle.loads(pickle.dumps(Rules.STANDARD)), Rules.STANDARD)
+
+if __name__ == "__main__":
+    unittest.main()
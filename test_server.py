@@ -0,0 +1,91 @@
+import asyncio
+import collections
+import unittest
+import Bitboard
+import server
+from Rules import PLAYER, AI
+
+def move_args(moves, engine="minimax", first=PLAYER):
+    return {"engine": engine, "moves": moves, "first": first, "budget": 0.05}
+
+class WorkerMoveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sessions = collections.OrderedDict()
+
+    def tearDown(self):
+        for _, engine, _ in self.sessions.values():
+            engine.close()
+
+    def move(self, moves, session="game", **kwargs):
+        return server.worker_move(self.sessions, session, move_args(moves, **kwargs), 1 << 10, None)
+
+    def test_reuses_the_session_engine(self):
+        for engine in server.ENGINES:
+            with self.subTest(engine=engine):
+                self.move([3], engine, engine=engine)
+                first = self.sessions[engine][1]
+                result = self.move([3, 3, 4], engine, engine=engine)
+                self.assertIs(self.sessions[engine][1], first)
+                self.assertEqual(self.sessions[engine][2], [3, 3, 4])
+                position, player = Bitboard.Bitboard.from_moves([3, 3, 4])
+                self.assertTrue(first.in_sync(position, player))
+                self.assertIn(result["move"], position.get_available_actions())
+
+    def test_digit_strings_are_the_same_game(self):
+        self.move(["3"])
+        first = self.sessions["game"][1]
+        result = self.move(["3", "3", 4])
+        self.assertIs(self.sessions["game"][1], first)
+        self.assertEqual(self.sessions["game"][2], [3, 3, 4])
+        self.assertIn(result["move"], range(7))
+
+    def test_other_game_rebuilds_the_engine(self):
+        self.move([3, 3])
+        first = self.sessions["game"][1]
+        self.move([2, 3, 4], first=AI)
+        self.assertIsNot(self.sessions["game"][1], first)
+        self.assertEqual(self.sessions["game"][2], [2, 3, 4])
+
+    def test_rejects_illegal_moves(self):
+        for moves in ([7], ["x"], [0] * 7, [0, 1, 0, 1, 0, 1, 0]):
+            with self.assertRaises(ValueError):
+                self.move(moves)
+
+class MoveServerTest(unittest.TestCase):
+
+    # runs requests through a one-worker server, returns the responses and
+    # the server after stop()
+    def serve(self, requests):
+        move_server = server.MoveServer(workers=1, think_time=0.05)
+        async def run():
+            move_server.start()
+            try:
+                return [await move_server.handle(request) for request in requests]
+            finally:
+                move_server.stop()
+        return asyncio.run(run()), move_server
+
+    def test_stop_joins_the_reader(self):
+        responses, move_server = self.serve([{"session": "a", "engine": "minimax", "moves": [3]}])
+        self.assertIn(responses[0]["move"], range(7))
+        self.assertFalse(move_server.reader.is_alive())
+        self.assertFalse(any(process.is_alive() for process in move_server.processes))
+
+    def test_stats_count_moves_only(self):
+        requests = [
+            {"session": "a", "engine": "minimax", "moves": []},
+            {"session": "a", "engine": "minimax", "moves": [3, 3]},
+            {"op": "end", "session": "a"},
+            {"op": "end", "session": "b"},
+            {"op": "stats"},
+        ]
+        responses, _ = self.serve(requests)
+        self.assertEqual(responses[2], {"ended": True})
+        self.assertEqual(responses[3], {"ended": False})
+        stats = responses[4]
+        self.assertEqual(stats["completed"], 2)
+        self.assertEqual(stats["latency_max"], max(response["latency"] for response in responses[:2]))
+
+if __name__ == "__main__":
+    unittest.main()
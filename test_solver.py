@@ -0,0 +1,92 @@
+import math
+import random
+import unittest
+import Bitboard
+import Rules
+import Solver
+from Rules import PLAYER, AI
+from test_bitboard import random_positions
+
+# exact score of board for player to move with the solver's convention, by
+# plain negamax over every move
+def brute_force_score(board, player):
+    geometry = board.geometry
+    if board.is_full():
+        return 0
+    opp = AI if player == PLAYER else PLAYER
+    actions = board.get_available_actions()
+    for action in actions:
+        board.play(action, player)
+        won = board.winning_move(player)
+        board.undo(action, player)
+        if won:
+            return (geometry.size + 1 - board.moves) // 2
+    best = -math.inf
+    for action in actions:
+        board.play(action, player)
+        best = max(best, -brute_force_score(board, opp))
+        board.undo(action, player)
+    return best
+
+class SolverTest(unittest.TestCase):
+
+    # positions with at most `empty` cells left, so that plain negamax is quick
+    def check_against_negamax(self, geometry, count, empty, seed):
+        rng = random.Random(seed)
+        solver = Solver.Solver(time_limit=60, tt_size=1 << 16)
+        checked = 0
+        while checked < count:
+            (board, player), = random_positions(geometry, 1, rng)
+            if board.is_over() or geometry.size - board.moves > empty:
+                continue
+            solver.set_position(board, player)
+            solver.deadline = math.inf
+            expected = brute_force_score(board, player)
+            current = board.boards[player]
+            self.assertEqual(solver.solve(current, board.mask, board.moves), expected)
+            move, score = solver.solve_move(current, board.mask, board.moves)
+            self.assertEqual(score, expected)
+            board.play(move, player)
+            if not board.winning_move(player):
+                self.assertEqual(-brute_force_score(board, AI if player == PLAYER else PLAYER), expected)
+            checked += 1
+
+    def test_small_board(self):
+        self.check_against_negamax(Rules.geometry(4, 4), 60, 11, 9)
+
+    def test_standard_board_endgames(self):
+        self.check_against_negamax(Rules.STANDARD, 60, 9, 10)
+
+    def test_mirror_image_scores_the_same(self):
+        rng = random.Random(11)
+        solver = Solver.Solver(time_limit=60, tt_size=1 << 16)
+        geometry = Rules.STANDARD
+        checked = 0
+        while checked < 20:
+            moves = [rng.randrange(geometry.cols) for _ in range(30)]
+            try:
+                board, player = Bitboard.Bitboard.from_moves(moves)
+                mirror, _ = Bitboard.Bitboard.from_moves([geometry.cols - 1 - move for move in moves])
+            except ValueError:
+                continue
+            if board.is_over():
+                continue
+            scores = []
+            for position in (board, mirror):
+                solver.set_position(position, player)
+                solver.deadline = math.inf
+                scores.append(solver.solve(position.boards[player], position.mask, position.moves))
+            self.assertEqual(scores[0], scores[1])
+            self.assertEqual(Solver.canonical_key(geometry, board.boards[player], board.mask), Solver.canonical_key(geometry, mirror.boards[player], mirror.mask))
+            checked += 1
+
+    def test_best_move(self):
+        solver = Solver.Solver(time_limit=0.5)
+        # wins at either end of an open three, blocks the only threat
+        for moves, expected in (("334455", {2, 6}), ("00112", {3})):
+            position, player = Bitboard.Bitboard.from_moves(moves)
+            self.assertIn(solver.best_move(position, player)[0], expected)
+        solver.close()
+
+if __name__ == "__main__":
+    unittest.main()
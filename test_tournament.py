@@ -0,0 +1,81 @@
+import math
+import random
+import unittest
+import Bitboard
+import tournament
+from Rules import PLAYER, AI
+
+class RatingTest(unittest.TestCase):
+
+    def test_no_games(self):
+        self.assertEqual(tournament.rating(0, 0, 0), (0.5, 0.0, -math.inf, math.inf))
+
+    def test_even_score(self):
+        score, elo, low, high = tournament.rating(10, 5, 10)
+        self.assertEqual((score, elo), (0.5, 0.0))
+        self.assertAlmostEqual(low, -high)
+        self.assertLess(low, 0)
+
+    def test_known_values(self):
+        score, elo, low, high = tournament.rating(75, 0, 25)
+        self.assertEqual(score, 0.75)
+        self.assertAlmostEqual(elo, 400 * math.log10(3))
+        # standard deviation sqrt(0.1875 / 100) of the mean score
+        margin = 1.96 * math.sqrt(0.1875 / 100)
+        self.assertAlmostEqual(low, tournament.elo(0.75 - margin))
+        self.assertAlmostEqual(high, tournament.elo(0.75 + margin))
+        self.assertLess(low, elo)
+        self.assertLess(elo, high)
+
+    def test_colors_swapped(self):
+        for wins, draws, losses in ((3, 4, 5), (20, 1, 7), (0, 9, 2)):
+            score, elo, low, high = tournament.rating(wins, draws, losses)
+            other = tournament.rating(losses, draws, wins)
+            self.assertAlmostEqual(score, 1 - other[0])
+            self.assertAlmostEqual(elo, -other[1])
+            self.assertAlmostEqual(low, -other[3])
+            self.assertAlmostEqual(high, -other[2])
+
+    def test_clamped(self):
+        score, elo, low, high = tournament.rating(10, 0, 0)
+        self.assertEqual(score, 1.0)
+        self.assertTrue(math.isfinite(elo))
+        self.assertEqual((low, high), (elo, elo))
+        self.assertAlmostEqual(tournament.elo(0.0), -elo)
+
+class TournamentTest(unittest.TestCase):
+
+    def test_parse_spec(self):
+        self.assertEqual(tournament.parse_spec("mcts:time=0.5,c=1.4,policy=heavy"), ("mcts", {"time_limit": 0.5, "balance_factor": 1.4, "rollout_policy": "heavy"}))
+        self.assertEqual(tournament.parse_spec("minimax"), ("minimax", {}))
+        for spec in ("alphazero", "mcts:depth=3", "minimax:depth=deep"):
+            with self.assertRaises(ValueError):
+                tournament.parse_spec(spec)
+
+    def test_random_openings(self):
+        openings = tournament.random_openings(50, 4, random.Random(1))
+        self.assertEqual(len(openings), 50)
+        self.assertEqual(len({tuple(moves) for moves in openings}), 50)
+        for moves in openings:
+            position, player = Bitboard.Bitboard.from_moves(moves)
+            self.assertEqual(position.moves, 4)
+            for side in (PLAYER, AI):
+                self.assertFalse(tournament.has_win_in_one(position, side))
+
+    def test_play_game(self):
+        specs = ["minimax:depth=1", "minimax:depth=2"]
+        first, second, score, moves = tournament.play_game((1, 0, specs, "7x6", [3, 3], 0))
+        self.assertEqual((first, second), (1, 0))
+        position, player = Bitboard.Bitboard.from_moves(moves)
+        self.assertEqual(moves[:2], [3, 3])
+        # the last mover won, or the board is full and the game drawn
+        last = AI if player == PLAYER else PLAYER
+        if score == 0.5:
+            self.assertTrue(position.is_full())
+            self.assertFalse(position.winning_move(PLAYER) or position.winning_move(AI))
+        else:
+            self.assertEqual(score, 1.0 if last == PLAYER else 0.0)
+            self.assertTrue(position.winning_move(last))
+
+if __name__ == "__main__":
+    unittest.main()
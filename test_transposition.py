@@ -0,0 +1,87 @@
+import math
+import random
+import unittest
+import MiniMax
+import Rules
+import TranspositionTable
+from Rules import PLAYER, AI
+from TranspositionTable import EXACT, LOWER, UPPER
+from test_bitboard import random_positions
+from test_minimax import plain_minimax
+
+class TranspositionTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tt = TranspositionTable.TranspositionTable(8)
+        # keys of one bucket
+        self.a, self.b, self.c = 5, 5 + self.tt.num_buckets, 5 + 2 * self.tt.num_buckets
+
+    def test_store_and_probe(self):
+        self.assertIsNone(self.tt.probe(self.a))
+        self.tt.store(self.a, 3, LOWER, math.inf, 6)
+        self.assertEqual(self.tt.probe(self.a), (3, LOWER, math.inf, 6))
+        self.assertIsNone(self.tt.probe(self.b))
+        self.assertEqual((self.tt.hits, self.tt.misses, self.tt.collisions), (1, 2, 1))
+        # the same position is updated in place, even by a shallower search
+        self.tt.store(self.a, 1, EXACT, -2.5, 0)
+        self.assertEqual(self.tt.probe(self.a), (1, EXACT, -2.5, 0))
+        self.assertEqual((self.tt.filled(), self.tt.overwrites), (1, 0))
+
+    def test_deepest_search_stays(self):
+        self.tt.store(self.a, 5, EXACT, 1, 1)
+        self.tt.store(self.b, 2, UPPER, 2, 2)
+        self.assertEqual(self.tt.probe(self.a), (5, EXACT, 1, 1))
+        self.assertEqual(self.tt.probe(self.b), (2, UPPER, 2, 2))
+        # the always-replace slot takes the latest shallow store
+        self.tt.store(self.c, 4, LOWER, 3, 3)
+        self.assertEqual(self.tt.probe(self.a), (5, EXACT, 1, 1))
+        self.assertIsNone(self.tt.probe(self.b))
+        self.assertEqual(self.tt.probe(self.c), (4, LOWER, 3, 3))
+        self.assertEqual(self.tt.overwrites, 1)
+        # a search at least as deep replaces the deepest one
+        self.tt.store(self.b, 5, EXACT, 4, 4)
+        self.assertIsNone(self.tt.probe(self.a))
+        self.assertEqual(self.tt.probe(self.b), (5, EXACT, 4, 4))
+        self.assertEqual(self.tt.probe(self.c), (4, LOWER, 3, 3))
+        # other buckets are untouched
+        self.assertEqual(self.tt.filled(), 2)
+
+    def test_clear_and_memory(self):
+        # shallower and shallower, so that both slots of every bucket fill
+        for key in range(20):
+            self.tt.store(key, 20 - key, EXACT, key, 0)
+        self.assertEqual(self.tt.filled(), self.tt.size)
+        self.tt.clear()
+        self.assertEqual(self.tt.filled(), 0)
+        self.assertIsNone(self.tt.probe(3))
+        # key, depth, flag, score and action
+        self.assertEqual(self.tt.memory_usage(), self.tt.size * (8 + 1 + 1 + 8 + 1))
+        self.assertEqual(self.tt.stats()["bytes"], self.tt.memory_usage())
+
+class MiniMaxTableTest(unittest.TestCase):
+
+    # a search two moves later starts from the entries of the previous move,
+    # stored at the depth it now searches, and must still score like plain
+    # minimax
+    def test_reused_table_keeps_scores(self):
+        depth = 4
+        for board, player in random_positions(Rules.geometry(4, 5), 20, random.Random(1)):
+            if board.is_over():
+                continue
+            engine = MiniMax.MiniMax(time_limit=math.inf, max_depth=depth + 2, tt_size=1 << 12)
+            engine.best_move(board, player)
+            engine.max_depth = depth
+            opp = AI if player == PLAYER else PLAYER
+            for move in board.get_available_actions()[:3]:
+                board.play(move, player)
+                for reply in board.get_available_actions()[:3]:
+                    board.play(reply, opp)
+                    if not board.is_over():
+                        _, stats = engine.best_move(board, player)
+                        self.assertEqual(stats["score"], plain_minimax(board, depth, player, player))
+                    board.undo(reply, opp)
+                board.undo(move, player)
+            engine.close()
+
+if __name__ == "__main__":
+    unittest.main()
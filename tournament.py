@@ -0,0 +1,201 @@
+import argparse
+import itertools
+import json
+import math
+import multiprocessing as mp
+import random
+import time
+import Bitboard
+import GameRecords
+import MCTS
+import MiniMax
+import Rules
+import Solver
+from Rules import PLAYER, AI
+
+# spec option -> (constructor argument, type) of every engine
+OPTIONS = {
+    "minimax": {"time": ("time_limit", float), "depth": ("max_depth", int), "tt": ("tt_size", int)},
+    "mcts": {"time": ("time_limit", float), "c": ("balance_factor", float), "rollouts": ("rollouts_per_leaf", int), "policy": ("rollout_policy", str)},
+    "solver": {"time": ("time_limit", float), "tt": ("tt_size", int)},
+}
+ENGINES = {"minimax": MiniMax.MiniMax, "mcts": MCTS.MCTS, "solver": Solver.Solver}
+
+# z of the two-sided 95% confidence interval
+Z95 = 1.96
+
+# parses "name:option=value,..." (e.g. "mcts:time=0.5,c=1.4") into
+# (name, constructor arguments), raises ValueError
+def parse_spec(spec):
+    name, _, options = spec.partition(":")
+    if name not in ENGINES:
+        raise ValueError(f"unknown engine {name!r} in {spec!r}")
+    kwargs = {}
+    for option in filter(None, options.split(",")):
+        key, _, value = option.partition("=")
+        if key not in OPTIONS[name]:
+            raise ValueError(f"unknown option {key!r} for {name}, expected one of {', '.join(OPTIONS[name])}")
+        argument, kind = OPTIONS[name][key]
+        kwargs[argument] = kind(value)
+    return name, kwargs
+
+def make_engine(spec):
+    name, kwargs = parse_spec(spec)
+    return ENGINES[name](**kwargs)
+
+# count random openings of plies moves, none of them won or with a win in
+# one for the side to move, so that no game is decided by the opening
+def random_openings(count, plies, rng, geometry=Rules.STANDARD):
+    openings = []
+    seen = set()
+    attempts = 0
+    while len(openings) < count and attempts < 100 * count:
+        attempts += 1
+        position = Bitboard.Bitboard(geometry)
+        player = PLAYER
+        moves = []
+        for _ in range(plies):
+            move = rng.choice(position.get_available_actions())
+            position.play(move, player)
+            moves.append(move)
+            player = AI if player == PLAYER else PLAYER
+        if has_win_in_one(position, player) or has_win_in_one(position, AI if player == PLAYER else PLAYER):
+            continue
+        if tuple(moves) not in seen:
+            seen.add(tuple(moves))
+            openings.append(moves)
+    return openings
+
+def has_win_in_one(position, player):
+    for move in position.get_available_actions():
+        position.play(move, player)
+        won = position.winning_move(player)
+        position.undo(move, player)
+        if won:
+            return True
+    return False
+
+# plays one game in a worker; first moves first after the opening.
+# returns (first, second, score of first, moves)
+def play_game(task):
+    first, second, specs, board, opening, seed = task
+    random.seed(seed)
+    engines = {PLAYER: make_engine(specs[first]), AI: make_engine(specs[second])}
+    position, player = Bitboard.Bitboard.from_moves(opening, PLAYER, Rules.parse(board))
+    # first plays PLAYER's pieces, whoever is to move after the opening
+    for engine in engines.values():
+        engine.set_position(position, player)
+    moves = list(opening)
+    score = 0.5
+    try:
+        while not position.is_full():
+            move, _ = engines[player].best_move(position, player)
+            position.play(move, player)
+            moves.append(move)
+            for engine in engines.values():
+                engine.play(move, player)
+            if position.winning_move(player):
+                score = 1.0 if player == PLAYER else 0.0
+                break
+            player = AI if player == PLAYER else PLAYER
+    finally:
+        for engine in engines.values():
+            engine.close()
+    return first, second, score, moves
+
+# Elo difference matching an expected score, clamped away from +-inf
+def elo(score):
+    score = min(max(score, 1e-3), 1 - 1e-3)
+    return -400 * math.log10(1 / score - 1)
+
+# (wins, draws, losses) -> (score, elo, elo low, elo high), the interval from
+# the normal approximation of the mean score
+def rating(wins, draws, losses):
+    games = wins + draws + losses
+    if not games:
+        return 0.5, 0.0, -math.inf, math.inf
+    score = (wins + 0.5 * draws) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = Z95 * math.sqrt(variance / games)
+    return score, elo(score), elo(score - margin), elo(score + margin)
+
+# round robin between specs, every opening played twice with colors swapped,
+# the games are appended to the record stream at record_path if given
+def run(specs, openings, workers=None, seed=0, record_path=None, board="7x6"):
+    rng = random.Random(seed)
+    tasks = []
+    for a, b in itertools.combinations(range(len(specs)), 2):
+        for opening in openings:
+            tasks.append((a, b, specs, board, opening, rng.getrandbits(64)))
+            tasks.append((b, a, specs, board, opening, rng.getrandbits(64)))
+    # results[a][b] = [wins, draws, losses] of a against b
+    results = [[[0, 0, 0] for _ in specs] for _ in specs]
+    games = []
+    writer = GameRecords.GameWriter(record_path) if record_path else None
+    with mp.Pool(workers or mp.cpu_count()) as executor:
+        for first, second, score, moves in executor.imap_unordered(play_game, tasks):
+            if writer is not None:
+                writer.write(moves, PLAYER)
+            outcome = {1.0: 0, 0.5: 1, 0.0: 2}[score]
+            results[first][second][outcome] += 1
+            results[second][first][2 - outcome] += 1
+            games.append({"first": specs[first], "second": specs[second], "score": score, "moves": moves})
+    if writer is not None:
+        writer.close()
+    return results, games
+
+# standings rate every engine by its score against the whole field, pairs
+# give the Elo difference of every head-to-head match
+def report(specs, results):
+    standings = []
+    for i, spec in enumerate(specs):
+        total = [sum(results[i][j][k] for j in range(len(specs))) for k in range(3)]
+        score, rating_elo, low, high = rating(*total)
+        standings.append({"engine": spec, "wins": total[0], "draws": total[1], "losses": total[2], "score": score, "elo": rating_elo, "elo_low": low, "elo_high": high})
+    pairs = []
+    for i, j in itertools.combinations(range(len(specs)), 2):
+        score, diff, low, high = rating(*results[i][j])
+        wins, draws, losses = results[i][j]
+        pairs.append({"engine": specs[i], "opponent": specs[j], "wins": wins, "draws": draws, "losses": losses, "score": score, "elo": diff, "elo_low": low, "elo_high": high})
+    return {"standings": standings, "pairs": pairs}
+
+def print_report(summary):
+    width = max(len(row["engine"]) for row in summary["standings"])
+    print(f"{'engine':<{width}} {'W':>5} {'D':>5} {'L':>5} {'score':>6} {'elo':>6}  95% interval")
+    for row in sorted(summary["standings"], key=lambda row: -row["score"]):
+        print(f"{row['engine']:<{width}} {row['wins']:>5} {row['draws']:>5} {row['losses']:>5} {row['score']:>6.3f} {row['elo']:>+6.0f}  [{row['elo_low']:+.0f}, {row['elo_high']:+.0f}]")
+    print()
+    for row in summary["pairs"]:
+        print(f"{row['engine']} vs {row['opponent']}: +{row['wins']} ={row['draws']} -{row['losses']}  "
+              f"elo {row['elo']:+.0f} [{row['elo_low']:+.0f}, {row['elo_high']:+.0f}]")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Round-robin tournament between engine configurations")
+    parser.add_argument("engines", nargs="+", help="engine specs, e.g. minimax:depth=4,time=1 mcts:time=0.5,c=1.4")
+    parser.add_argument("--openings", type=int, default=10, help="random openings, each played with both colors")
+    parser.add_argument("--plies", type=int, default=2, help="moves of every opening")
+    parser.add_argument("--workers", type=int, default=mp.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file for the tables and every game")
+    parser.add_argument("--record", help="game record stream to append the games to (see GameRecords.py)")
+    parser.add_argument("--board", default="7x6", help="board size as COLSxROWS, e.g. 8x7")
+    args = parser.parse_args()
+    if len(args.engines) < 2:
+        parser.error("at least two engines are needed")
+    try:
+        geometry = Rules.parse(args.board)
+        for spec in args.engines:
+            parse_spec(spec)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.record and not GameRecords.supports(geometry):
+        parser.error(f"{geometry.name} games do not fit in game records (at most 8 columns and 63 cells)")
+    openings = random_openings(args.openings, args.plies, random.Random(args.seed), geometry)
+    t0 = time.time()
+    results, games = run(args.engines, openings, args.workers, args.seed, args.record, geometry.name)
+    summary = report(args.engines, results)
+    print_report(summary)
+    print(f"\n{len(games)} games in {time.time() - t0:.1f}s")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(dict(summary, games=games), f, indent=2)
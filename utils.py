@@ -1,115 +1,142 @@
-import MCTS
+import random
+import NodePool
+from Rules import EMPTY, PLAYER, AI
 
-# players
-EMPTY = 0
-PLAYER = 1
-AI = 2
-
-# board dimensions
-ROW = 6
-COL = 7
-
-# drop pieces in a board (only used for creating children)
+# returns a copy of parent_state with player's piece dropped in column action
 def drop_piece(parent_state, action, player):
-    row = get_next_open_row(parent_state, action)
     new_state = parent_state.copy()
-    new_state[row][action] = player
+    new_state.play(action, player)
     return new_state
 
 # returns index of first available row in a given column
 def get_next_open_row(parent_state, col):
-    for i in range(ROW-1, -1, -1):
-        if parent_state[i][col] == EMPTY:
-            return i
-        
+    return parent_state.get_next_open_row(col)
+
 def winning_move(state, player):
-    # Check horizontal locations for win
-    for c in range(COL-3):
-        for r in range(ROW):
-            if state[r][c] == player and state[r][c+1] == player and state[r][c+2] == player and state[r][c+3] == player:
-                return True
-    # Check vertical locations for win
-    for c in range(COL):
-        for r in range(ROW-3):
-            if state[r][c] == player and state[r+1][c] == player and state[r+2][c] == player and state[r+3][c] == player:
-                return True
-    # Check negatively sloped diaganols
-    for c in range(COL-3):
-        for r in range(ROW-3):
-            if state[r][c] == player and state[r+1][c+1] == player and state[r+2][c+2] == player and state[r+3][c+3] == player:
-                return True
-    # Check positively sloped diaganols
-    for c in range(COL-3):
-        for r in range(3, ROW):
-            if state[r][c] == player and state[r-1][c+1] == player and state[r-2][c+2] == player and state[r-3][c+3] == player:
-                return True
-            
+    return state.winning_move(player)
+
 def get_available_actions(state):
-    return [c for c in range(COL) if any(state[:, c] == 0)]
+    return state.get_available_actions()
 
-def eval_board(state):
-    return score_position(state, AI) + score_position(state, PLAYER)
+# heuristic score of state from player's side
+def eval_board(state, player=AI):
+    opp = AI if player == PLAYER else PLAYER
+    won = winning_move(state, player)
+    lost = winning_move(state, opp)
+    if won != lost:
+        return float("inf") if won else float("-inf")
+    return score_position(state, player, count_fours=False) - score_position(state, opp, count_fours=False)
 
-def evaluate_window(window, piece):
+def evaluate_window(pieces, empty):
     score = 0
-    if window.count(piece) == 4:
+    if pieces == 4:
         score += float("inf")
-    elif window.count(piece) == 3 and window.count(EMPTY) == 1:
+    elif pieces == 3 and empty == 1:
         score += 5
-    elif window.count(piece) == 2 and window.count(EMPTY) == 2:
+    elif pieces == 2 and empty == 2:
         score += 2
     return score
 
-def score_position(state, player):
+def score_position(state, player, count_fours=True):
+        geometry = state.geometry
+        pieces = state.boards[player]
+        empty = ~state.mask & geometry.board_mask
         score = 0
         # Score center column
-        center_array = [int(i) for i in list(state[:, COL // 2])]
-        center_count = center_array.count(player)
+        center_count = (pieces & geometry.center_mask).bit_count()
         score += center_count * 3
-        # Score horizontal
-        for r in range(ROW):
-            row_array = [int(i) for i in list(state[r, :])]
-            for c in range(COL - 3):
-                window = row_array[c : c + 4]
-                score += evaluate_window(window, player)
-        # Score vertical
-        for c in range(COL):
-            col_array = [int(i) for i in list(state[:, c])]
-            for r in range(ROW - 3):
-                window = col_array[r : r + 4]
-                score += evaluate_window(window, player)
-        # Score positively sloped diagonal
-        for r in range(ROW - 3):
-            for c in range(COL - 3):
-                window = [state[r + i][c + i] for i in range(4)]
-                score += evaluate_window(window, player)
-        # Score negatively sloped diagonal
-        for r in range(ROW - 3):
-            for c in range(COL - 3):
-                window = [state[r + 3 - i][c + i] for i in range(4)]
-                score += evaluate_window(window, player)
+        # Score horizontal, vertical and both diagonals
+        for window in geometry.windows:
+            count = (pieces & window).bit_count()
+            if count < 4 or count_fours:
+                score += evaluate_window(count, (empty & window).bit_count())
         return score
 
 def is_terminal_node(state, player):
     return winning_move(state, player) or len(get_available_actions(state)) == 0
 
-def generate_children(game_tree, parent_node_id, player):
-    # get available locations
-    parent_state = game_tree.tree[parent_node_id]["state"]
-    actions_available = get_available_actions(parent_state)
-    for action in actions_available:
-        # create new child node and add it to tree
-        child_id = parent_node_id + (action,)
-        child_state = drop_piece(parent_state, action, player)
-        # Initialize the child node in the tree
-        game_tree.tree[child_id] = {
-            "state": child_state,
-            "player": player,
-            "parent": parent_node_id,
-            "action": action,
-            "children": []
-        }
-        if isinstance(game_tree, MCTS.MCTS):
-            game_tree.tree[child_id]["visits"] = 0
-            game_tree.tree[child_id]["wins"] = 0
-        game_tree.tree[parent_node_id]["children"].append(child_id)
\ No newline at end of file
+# Batch versions of get_available_actions, winning_move and is_terminal_node.
+# states is either an (N, rows, cols) array of cells like Gameboard.state
+# (row 0 on top), any board size, or a sequence of N Bitboards of one
+# geometry that fits in 64 bits (ValueError otherwise); each call handles
+# all N positions with a few numpy operations. numpy is imported on the
+# first call only, so that the scalar functions load without it
+
+# (N, cols) bool array, true for the playable columns of every position
+def get_available_actions_batch(states):
+    import numpy as np
+    import BatchRollout
+    if isinstance(states, np.ndarray):
+        return states[:, 0, :] == EMPTY
+    geometry = states[0].geometry
+    _, column_limits = BatchRollout.tables(geometry)
+    heights = np.array([state.heights for state in states], dtype=np.int64).reshape(-1, geometry.cols)
+    return heights < column_limits
+
+# (N,) bool array, true where player has four in a row
+def winning_move_batch(states, player):
+    import numpy as np
+    import BatchRollout
+    if isinstance(states, np.ndarray):
+        pieces = states == player
+        rows, cols = pieces.shape[1:]
+        won = np.zeros(len(pieces), dtype=bool)
+        # horizontal, vertical and both diagonal lines of the four cells
+        # starting at every (row, col) where they fit
+        for dr, dc, r0, r1 in ((0, 1, 0, rows), (1, 0, 0, rows - 3), (1, 1, 0, rows - 3), (-1, 1, 3, rows)):
+            c1 = cols - 3 * dc
+            line = pieces[:, r0:r1, :c1]
+            for i in range(1, 4):
+                line = line & pieces[:, r0 + i * dr:r1 + i * dr, i * dc:c1 + i * dc]
+            won |= line.any(axis=(1, 2))
+        return won
+    geometry = states[0].geometry
+    # ValueError for boards wider than 64 bits before numpy overflows
+    BatchRollout.tables(geometry)
+    boards = np.fromiter((state.boards[player] for state in states), dtype=np.uint64, count=len(states))
+    return BatchRollout.has_four_batch(boards, geometry)
+
+# (N,) bool array, true where player has won or the board is full
+def is_terminal_node_batch(states, player):
+    return winning_move_batch(states, player) | ~get_available_actions_batch(states).any(axis=1)
+
+# bitmask of the playable columns of state (bit c for column c), 0 if the
+# game is over, opp being the player who made the last move
+def untried_moves(state, opp):
+    if state.winning_move(opp):
+        return 0
+    heights = state.heights
+    limits = state.geometry.column_limits
+    moves = 0
+    for c in range(len(limits)):
+        if heights[c] < limits[c]:
+            moves |= 1 << c
+    return moves
+
+# adds one child for an untried move of parent_node_id and returns it, or
+# NodePool.NO_NODE once every move has a child (or the game is over); the
+# state is not changed. A winning move is generated first, the others in
+# random order
+def generate_child(pool, parent_node_id, parent_state, player):
+    untried = pool.untried[parent_node_id]
+    if untried == NodePool.UNEXPANDED:
+        untried = untried_moves(parent_state, pool.player[parent_node_id])
+        if untried:
+            geometry = parent_state.geometry
+            wins = geometry.winning_cells(parent_state.boards[player], parent_state.mask) & parent_state.available_mask()
+            if wins:
+                action = (wins.bit_length() - 1) // geometry.height
+                pool.untried[parent_node_id] = untried & ~(1 << action)
+                return pool.add_child(parent_node_id, action, player)
+    if not untried:
+        pool.untried[parent_node_id] = 0
+        return NodePool.NO_NODE
+    actions = [c for c in range(untried.bit_length()) if untried >> c & 1]
+    action = actions[0] if len(actions) == 1 else random.choice(actions)
+    pool.untried[parent_node_id] = untried & ~(1 << action)
+    return pool.add_child(parent_node_id, action, player)
+
+# adds a child for every untried move of parent_node_id
+def generate_children(pool, parent_node_id, parent_state, player):
+    while generate_child(pool, parent_node_id, parent_state, player) != NodePool.NO_NODE:
+        pass